@@ -0,0 +1,177 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+import cv2
+
+import model_store
+from recognize import FaceRecognizer, prediction_record, read_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif", ".webp", ".ppm", ".pgm")
+RECORD_FIELDS = ["path", "face", "x", "y", "w", "h", "label", "name", "distance", "recognized", "error"]
+# 每个工作进程最多积压的任务块数：路径按块提交，提交在前、取结果在后，输入不会被一次性读完
+PENDING_PER_WORKER = 2
+
+# 每个工作进程只加载一次模型
+_worker_recognizer = None
+_worker_annotate_dir = None
+
+
+def iter_image_paths(sources, list_file=None):
+    """逐个产出图片路径：目录递归遍历，文件直接使用，list_file 中每行一个路径"""
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield source
+
+    if list_file:
+        with open(list_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+
+
+def _init_worker(model_path, threshold, annotate_dir):
+    global _worker_recognizer, _worker_annotate_dir
+    cv2.setNumThreads(1)
+    _worker_recognizer = FaceRecognizer(model_path)
+    _worker_recognizer.set_threshold(threshold)
+    _worker_recognizer.load_model()
+    _worker_annotate_dir = annotate_dir
+
+
+def _recognize_task(task):
+    """识别一张图片，返回该图片的人脸记录列表；没有检测到人脸时返回一条 face 为 None 的记录"""
+    index, path = task
+    try:
+        image = read_image(path)
+        annotate = _worker_annotate_dir is not None
+        image, faces = _worker_recognizer.analyze_image(image, annotate=annotate)
+    except Exception as e:
+        return path, [{'path': path, 'error': str(e)}]
+
+    if annotate:
+        ext = os.path.splitext(path)[1] or ".jpg"
+        out_path = os.path.join(_worker_annotate_dir, f"{index:08d}_{os.path.basename(path)}")
+        ok, encoded = cv2.imencode(ext, image)
+        if ok:
+            encoded.tofile(out_path)
+
+    # 识别字段与服务端（server.py）相同，均由 prediction_record 生成
+    records = []
+    for i, face in enumerate(faces):
+        x, y, w, h = (int(v) for v in face['box'])
+        records.append(dict({'path': path, 'face': i, 'x': x, 'y': y, 'w': w, 'h': h},
+                            **prediction_record(face['prediction'])))
+    if not records:
+        records.append({'path': path, 'face': None})
+    return path, records
+
+
+def _recognize_chunk(tasks):
+    return [_recognize_task(task) for task in tasks]
+
+
+def recognize_paths(paths, model_path=model_store.MODEL_DIR, threshold=50, workers=None,
+                    annotate_dir=None, chunksize=8):
+    """
+    批量识别图片
+    paths 可以是任意可迭代对象，每次取 chunksize 个路径提交一块，
+    同时最多 workers * PENDING_PER_WORKER 块未取回（Pool.imap 会在后台读完整个输入，因此不用它），
+    按输入顺序逐张产出 (path, records)；每个工作进程只加载一次模型
+    """
+    if annotate_dir:
+        os.makedirs(annotate_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    tasks = enumerate(paths)
+    pending = deque()
+    with Pool(workers, initializer=_init_worker, initargs=(model_path, threshold, annotate_dir)) as pool:
+        while True:
+            while len(pending) < workers * PENDING_PER_WORKER:
+                chunk = list(islice(tasks, chunksize))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(_recognize_chunk, (chunk,)))
+            if not pending:
+                return
+            for result in pending.popleft().get():
+                yield result
+
+
+class RecordWriter:
+    """把人脸记录写为 JSONL 或 CSV"""
+
+    def __init__(self, stream, fmt="jsonl"):
+        if fmt not in ("jsonl", "csv"):
+            raise Exception(f"不支持的输出格式: {fmt}")
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self.writer = csv.DictWriter(stream, fieldnames=RECORD_FIELDS, extrasaction="ignore")
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.fmt == "csv":
+            self.writer.writerow(record)
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量识别目录或列表中的图片，输出每个人脸的记录")
+    parser.add_argument("sources", nargs="*", help="图片文件或目录（递归）")
+    parser.add_argument("--list", dest="list_file", help="每行一个图片路径的列表文件")
+    parser.add_argument("-o", "--output", help="输出文件（默认标准输出）")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="输出格式（默认按扩展名，否则 jsonl）")
+    parser.add_argument("--model", default=model_store.MODEL_DIR, help="模型目录")
+    parser.add_argument("--threshold", type=float, default=50, help="识别阈值")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认CPU核数）")
+    parser.add_argument("--annotate-dir", help="保存带标注图片的目录（默认不绘制）")
+    args = parser.parse_args(argv)
+
+    if not args.sources and not args.list_file:
+        parser.error("请指定图片、目录或 --list")
+
+    fmt = args.format or ("csv" if args.output and args.output.lower().endswith(".csv") else "jsonl")
+    stream = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+
+    images = faces = recognized = errors = no_face = 0
+    start = time.perf_counter()
+    try:
+        writer = RecordWriter(stream, fmt)
+        paths = iter_image_paths(args.sources, args.list_file)
+        for _, records in recognize_paths(paths, args.model, args.threshold, args.workers, args.annotate_dir):
+            images += 1
+            for record in records:
+                writer.write(record)
+                if 'error' in record:
+                    errors += 1
+                elif record['face'] is None:
+                    no_face += 1
+                else:
+                    faces += 1
+                    recognized += int(record['recognized'])
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"完成: {images} 张图片, {faces} 个人脸 (已识别 {recognized}), {no_face} 张未检测到人脸, {errors} 个错误, "
+          f"{elapsed:.1f} 秒, {images / elapsed if elapsed > 0 else 0:.1f} 张/秒", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from metrics import RollingHistogram
+
+_STOP = object()
+
+
+class PredictionBatcher:
+    """
+    人脸识别的动态微批处理
+    多个线程提交人脸裁剪图并得到 Future；后台线程把等待中的提交合并为一次 predict_faces 调用，
+    一批最多 max_batch_size 个人脸，第一个人脸最多等待 max_wait_ms 毫秒
+    """
+
+    def __init__(self, recognizer, max_batch_size=32, max_wait_ms=5.0):
+        if max_batch_size < 1:
+            raise Exception("批大小必须大于等于1")
+
+        self.recognizer = recognizer
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_sizes = RollingHistogram()
+        self.queue_waits = RollingHistogram()
+        self.batches = 0
+        self.faces = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    def submit(self, face_image):
+        """提交一张人脸裁剪图（200x200 灰度），返回结果为 predict_faces 单项 dict 的 Future"""
+        if self._closed:
+            raise Exception("批处理器已关闭")
+        future = Future()
+        self._queue.put((face_image, future, time.perf_counter()))
+        return future
+
+    def submit_many(self, face_images):
+        return [self.submit(face) for face in face_images]
+
+    def predict_faces(self, face_images, timeout=None):
+        """
+        阻塞版本，可直接替换 recognizer.predict_faces
+        timeout 为整批的等待上限（秒），超时时取消尚未开始匹配的人脸并抛出 concurrent.futures.TimeoutError
+        （Python 3.11 起即内置的 TimeoutError，更早的版本是不同的类）
+        """
+        futures = self.submit_many(face_images)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        try:
+            return [future.result(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+                    for future in futures]
+        except FutureTimeoutError:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def close(self):
+        """停止后台线程，已提交的人脸处理完后返回"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self):
+        """阻塞取第一个提交，再在截止时间前尽量凑满一批"""
+        first = self._queue.get()
+        if first is _STOP:
+            return None, True
+
+        batch = [first]
+        deadline = first[2] + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._process(batch)
+
+        # 关闭前把队列里剩下的提交处理完
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                remaining.append(item)
+        for i in range(0, len(remaining), self.max_batch_size):
+            self._process(remaining[i:i + self.max_batch_size])
+
+    def _process(self, batch):
+        # 调用方已取消（等待超时）的人脸不再匹配；其余的标记为运行中，之后不能再被取消
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        faces = [item[0] for item in batch]
+        futures = [item[1] for item in batch]
+
+        with self._lock:
+            self.batches += 1
+            self.faces += len(batch)
+            self.batch_sizes.observe(len(batch))
+            for item in batch:
+                self.queue_waits.observe((started - item[2]) * 1000)
+
+        metrics = getattr(self.recognizer, "metrics", None)
+        if metrics is not None:
+            for item in batch:
+                metrics.observe("batch_wait", (started - item[2]) * 1000)
+
+        try:
+            predictions = self.recognizer.predict_faces(faces)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for future, prediction in zip(futures, predictions):
+            future.set_result(prediction)
+
+    def stats(self):
+        """批大小与排队等待（毫秒）的分布"""
+        with self._lock:
+            size_p50, size_p90, size_p99 = self.batch_sizes.quantiles()
+            wait_p50, wait_p90, wait_p99 = self.queue_waits.quantiles()
+            return {
+                'batches': self.batches,
+                'faces': self.faces,
+                'avg_batch_size': self.faces / self.batches if self.batches else 0.0,
+                'batch_size_p50': size_p50,
+                'batch_size_p90': size_p90,
+                'batch_size_p99': size_p99,
+                'wait_ms_p50': wait_p50,
+                'wait_ms_p90': wait_p90,
+                'wait_ms_p99': wait_p99,
+                'pending': self._queue.qsize(),
+            }
\ No newline at end of file
@@ -0,0 +1,534 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import model_store
+from gallery_index import GalleryIndex
+from matcher import LBPHMatcher, extract_histograms, feature_params
+from preprocess import preprocess_batch
+from recognize import FaceRecognizer
+from train import train
+
+# 结果文件格式版本，字段变化时递增
+BENCHMARK_VERSION = 2
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+DEFAULT_AXES = {
+    'users': [5, 20],
+    'samples': [10, 30],
+    'resolutions': ["640x480", "1280x720"],
+    'faces': [1, 4],
+    'profiles': ["lbph", "uniform", "uniform16", "riu2"],
+    'encodings': ["float32", "float16", "uint8", "pca"],
+    'index_users': [100, 400, 1600],
+}
+QUICK_AXES = {
+    'users': [3],
+    'samples': [5],
+    'resolutions': ["320x240"],
+    'faces': [1],
+    'profiles': ["lbph", "uniform"],
+    'encodings': ["float32", "uint8"],
+    'index_users': [50, 200],
+}
+PROBE_COUNT = 32
+# 索引扩展性测试：每个合成身份的样本数，以及用来混合出身份直方图的真实人脸直方图数
+INDEX_SAMPLES = 2
+INDEX_POOL = 32
+# 特征配置对比中不参与训练、作为陌生人探针的用户比例（至少 1 人）
+UNKNOWN_FRACTION = 0.25
+
+
+# -------------------- 合成数据 --------------------
+def make_identity(rng):
+    """随机生成一个合成身份的五官参数与皮肤纹理"""
+    return {
+        'face_w': rng.uniform(0.32, 0.40),
+        'face_h': rng.uniform(0.42, 0.48),
+        'skin': int(rng.integers(150, 200)),
+        'eye_dx': rng.uniform(0.13, 0.19),
+        'eye_y': rng.uniform(0.37, 0.43),
+        'eye_w': rng.uniform(0.06, 0.10),
+        'nose': rng.uniform(0.56, 0.64),
+        'mouth_y': rng.uniform(0.69, 0.75),
+        'mouth_w': rng.uniform(0.10, 0.18),
+        'texture': rng.normal(0, 12, (64, 64)).astype(np.float32),
+    }
+
+
+def draw_face(rng, identity, size):
+    """按身份参数画一张 size x size 的灰度卡通人脸（Haar 检测器可检出），每次带少量随机扰动"""
+    img = np.full((size, size), int(rng.integers(20, 60)), np.uint8)
+    c = size // 2 + int(rng.integers(-2, 3))
+    skin = int(np.clip(identity['skin'] + rng.integers(-10, 11), 0, 255))
+    cv2.ellipse(img, (c, c), (int(size * identity['face_w']), int(size * identity['face_h'])),
+                0, 0, 360, skin, -1)
+
+    ey = int(size * identity['eye_y'])
+    ex = int(size * identity['eye_dx'])
+    for side in (-1, 1):
+        cv2.ellipse(img, (c + side * ex, ey), (int(size * identity['eye_w']), int(size * 0.04)),
+                    0, 0, 360, 30, -1)
+        cv2.line(img, (c + side * ex - int(size * 0.09), ey - int(size * 0.09)),
+                 (c + side * ex + int(size * 0.09), ey - int(size * 0.09)), 40, max(1, size // 40))
+    cv2.line(img, (c, ey + int(size * 0.05)), (c, int(size * identity['nose'])), 110, max(1, size // 50))
+    cv2.ellipse(img, (c, int(size * identity['mouth_y'])), (int(size * identity['mouth_w']), int(size * 0.04)),
+                0, 0, 360, 60, -1)
+
+    texture = cv2.resize(identity['texture'], (size, size), interpolation=cv2.INTER_LINEAR)
+    noise = rng.normal(0, 4, (size, size))
+    img = np.clip(img.astype(np.float32) + texture + noise, 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(img, (5, 5), 0)
+
+
+def make_frame(rng, identities, width, height):
+    """生成一帧彩色图像，按网格放置每个身份的人脸，返回 BGR 帧"""
+    frame = np.full((height, width), 50, np.uint8)
+    cols = int(np.ceil(np.sqrt(len(identities))))
+    rows = int(np.ceil(len(identities) / cols))
+    cell = min(width // cols, height // rows)
+    size = max(60, int(cell * 0.7))
+    for i, identity in enumerate(identities):
+        row, col = divmod(i, cols)
+        x = col * (width // cols) + ((width // cols) - size) // 2
+        y = row * (height // rows) + ((height // rows) - size) // 2
+        frame[y:y + size, x:x + size] = draw_face(rng, identity, size)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def make_raw_dataset(raw_dir, identities, samples_per_user, rng):
+    """为每个身份生成 samples_per_user 张 320x240 的原始图像（人脸大小和位置随机）"""
+    for user_id, identity in enumerate(identities):
+        user_dir = os.path.join(raw_dir, f"user{user_id:03d}")
+        os.makedirs(user_dir, exist_ok=True)
+        for i in range(samples_per_user):
+            frame = np.full((240, 320), int(rng.integers(30, 70)), np.uint8)
+            size = int(rng.integers(110, 170))
+            x = int(rng.integers(0, 320 - size))
+            y = int(rng.integers(0, 240 - size))
+            frame[y:y + size, x:x + size] = draw_face(rng, identity, size)
+            cv2.imwrite(os.path.join(user_dir, f"{i}.jpg"), frame)
+
+
+# -------------------- 计时 --------------------
+def _time(fn, repeat):
+    """运行 repeat 次，返回每次耗时（秒）的列表"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _result(stage, params, items, timings, **extra):
+    seconds = statistics.median(timings)
+    return {
+        'stage': stage,
+        'params': params,
+        'items': items,
+        'seconds': seconds,
+        'best_seconds': min(timings),
+        'ms_per_item': seconds * 1000 / items if items else 0.0,
+        'items_per_sec': items / seconds if seconds > 0 else 0.0,
+        'extra': extra,
+    }
+
+
+# -------------------- 各阶段 --------------------
+def bench_dataset(work_dir, identities, samples, repeat, workers, rng):
+    """预处理与训练：返回 (结果列表, 模型目录, 处理后目录)"""
+    raw_dir = os.path.join(work_dir, "raw")
+    processed_dir = os.path.join(work_dir, "processed")
+    model_dir = os.path.join(work_dir, "model")
+    state_path = os.path.join(work_dir, "train_state.pkl")
+    make_raw_dataset(raw_dir, identities, samples, rng)
+
+    params = {'users': len(identities), 'samples': samples}
+    images = len(identities) * samples
+    stats = {}
+
+    def run_preprocess():
+        # 每次都从空目录开始，避免清单跳过
+        shutil.rmtree(processed_dir, ignore_errors=True)
+        stats.update(preprocess_batch(input_dir=raw_dir, output_dir=processed_dir, workers=workers))
+
+    results = [_result("preprocess", params, images, _time(run_preprocess, repeat),
+                       faces=stats['faces'], workers=stats['workers'])]
+
+    def run_train():
+        train(processed_dir, model_dir, state_path=state_path)
+
+    results.append(_result("train", params, stats['faces'], _time(run_train, repeat)))
+    return results, model_dir, processed_dir
+
+
+def bench_predict(model_dir, processed_dir, params, repeat):
+    """单次批量匹配 PROBE_COUNT 个人脸：全量匹配与索引匹配，并记录识别准确率"""
+    probes, truth = [], []
+    for user_name in sorted(os.listdir(processed_dir)):
+        user_dir = os.path.join(processed_dir, user_name)
+        for img_name in sorted(os.listdir(user_dir)):
+            if img_name.startswith("."):
+                continue
+            probes.append(cv2.imread(os.path.join(user_dir, img_name), cv2.IMREAD_GRAYSCALE))
+            truth.append(user_name)
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(probes), size=min(PROBE_COUNT, len(probes)), replace=False)
+    probes = [probes[i] for i in picks]
+    truth = [truth[i] for i in picks]
+
+    results = []
+    recognizer = FaceRecognizer(model_dir)
+    recognizer.load_model()
+    for use_index in (False, True):
+        recognizer.set_index(use_index)
+        predictions = recognizer.predict_faces(probes)
+        correct = sum(p['name'] == name for p, name in zip(predictions, truth))
+        stage = "predict_index" if use_index else "predict"
+        results.append(_result(stage, dict(params, gallery=len(recognizer.matcher)), len(probes),
+                               _time(lambda: recognizer.predict_faces(probes), repeat),
+                               accuracy=correct / len(probes)))
+    return results
+
+
+def _split_samples(processed_dir, train_dir, unknown_fraction=0.0):
+    """
+    每个用户的样本交替分为训练集（复制到 train_dir）与留出的探针，返回 (探针, 真实姓名)
+    unknown_fraction > 0 时最后一部分用户（至少 1 人，且至少留 1 人训练）不参与训练，
+    其全部样本作为陌生人探针，真实姓名为 None
+    """
+    users = sorted(os.listdir(processed_dir))
+    unknown = min(max(1, int(len(users) * unknown_fraction)), len(users) - 1) if unknown_fraction > 0 else 0
+    probes, truth = [], []
+    for index, user_name in enumerate(users):
+        user_dir = os.path.join(processed_dir, user_name)
+        names = sorted(name for name in os.listdir(user_dir) if not name.startswith("."))
+        if index >= len(users) - unknown:
+            probes.extend(cv2.imread(os.path.join(user_dir, img_name), cv2.IMREAD_GRAYSCALE) for img_name in names)
+            truth.extend([None] * len(names))
+            continue
+
+        os.makedirs(os.path.join(train_dir, user_name), exist_ok=True)
+        for i, img_name in enumerate(names):
+            if i % 2 == 0 or len(names) == 1:
+                shutil.copy(os.path.join(user_dir, img_name), os.path.join(train_dir, user_name, img_name))
+            else:
+                probes.append(cv2.imread(os.path.join(user_dir, img_name), cv2.IMREAD_GRAYSCALE))
+                truth.append(user_name)
+    return probes, truth
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def bench_profiles(work_dir, processed_dir, params, profiles, repeat):
+    """
+    特征配置对比：每个配置用一半样本训练，另一半作为留出探针，另有部分用户不参与训练作为陌生人探针；
+    记录模型大小、直方图维度、加载耗时、匹配耗时、识别准确率（已注册用户的最近邻是否正确），
+    以及按识别阈值判定的接受/拒绝数：已注册用户被正确接受、被拒绝，陌生人被误接受、被拒绝
+    """
+    train_dir = os.path.join(work_dir, "profile_train")
+    probes, truth = _split_samples(processed_dir, train_dir, UNKNOWN_FRACTION)
+    known = sum(name is not None for name in truth)
+    if not known:
+        return []
+
+    results = []
+    for profile in profiles:
+        model_dir = os.path.join(work_dir, f"model_{profile}")
+        train_seconds = _time(lambda: train(train_dir, model_dir, state_path=os.path.join(work_dir, "profile_state.pkl"),
+                                            profile=profile), 1)[0]
+
+        def load():
+            recognizer = FaceRecognizer(model_dir)
+            recognizer.slot.current = recognizer._read_model()
+            return recognizer
+
+        load_timings = _time(load, repeat)
+        recognizer = load()
+        predictions = recognizer.predict_faces(probes)
+        correct = sum(p['name'] == name for p, name in zip(predictions, truth) if name is not None)
+        genuine = [p['is_recognized'] and p['name'] == name
+                   for p, name in zip(predictions, truth) if name is not None]
+        impostor = [p['is_recognized'] for p, name in zip(predictions, truth) if name is None]
+        model = model_store.load_model(model_dir)
+        results.append(_result("profile", dict(params, profile=profile), len(probes),
+                               _time(lambda: recognizer.predict_faces(probes), repeat),
+                               accuracy=correct / known,
+                               threshold=recognizer.threshold,
+                               profile_scale=float(model['gallery'].get('profile_scale', 1.0)),
+                               genuine_accepted=sum(genuine),
+                               genuine_rejected=len(genuine) - sum(genuine),
+                               impostor_accepted=sum(impostor),
+                               impostor_rejected=len(impostor) - sum(impostor),
+                               dim=int(model['header']['dim']),
+                               model_bytes=_dir_bytes(os.path.join(model_dir, model['version'])),
+                               load_ms=statistics.median(load_timings) * 1000,
+                               train_seconds=train_seconds))
+    return results
+
+
+def bench_encodings(work_dir, processed_dir, params, encodings, repeat):
+    """
+    图库编码对比：用一半样本训练各编码的模型，另一半作为留出探针，
+    记录图库文件大小、匹配耗时、准确率以及与 float32 结果一致的比例
+    """
+    train_dir = os.path.join(work_dir, "encoding_train")
+    probes, truth = _split_samples(processed_dir, train_dir)
+    if not probes:
+        return []
+
+    results = []
+    reference = None
+    for encoding in ["float32"] + [e for e in encodings if e != "float32"]:
+        model_dir = os.path.join(work_dir, f"model_{encoding}")
+        train(train_dir, model_dir, state_path=os.path.join(work_dir, "encoding_state.pkl"), encoding=encoding)
+        recognizer = FaceRecognizer(model_dir)
+        recognizer.slot.current = recognizer._read_model()
+        predictions = [p['name'] for p in recognizer.predict_faces(probes)]
+        reference = reference or predictions
+        if encoding not in encodings:
+            continue
+
+        model = model_store.load_model(model_dir)
+        generation_dir = os.path.join(model_dir, model['version'])
+        gallery_bytes = os.path.getsize(os.path.join(generation_dir, model_store.HISTOGRAMS_FILE))
+        results.append(_result("encoding", dict(params, encoding=encoding), len(probes),
+                               _time(lambda: recognizer.predict_faces(probes), repeat),
+                               accuracy=sum(p == name for p, name in zip(predictions, truth)) / len(probes),
+                               agreement=sum(p == r for p, r in zip(predictions, reference)) / len(probes),
+                               dim=int(model['header']['dim']),
+                               gallery_bytes=gallery_bytes,
+                               # 与样本数无关的固定开销（主成分等）及其他文件
+                               other_bytes=_dir_bytes(generation_dir) - gallery_bytes))
+    return results
+
+
+def _synthetic_gallery(pool, users, samples, rng):
+    """
+    由真实人脸直方图混合出 users 个身份（每个身份为 3 个直方图的随机加权和），
+    每个样本再乘以随机扰动；返回 (直方图, 标签, 每个身份再取一个样本作为探针)
+    """
+    weights = rng.dirichlet(np.ones(3), users).astype(np.float32)
+    bases = np.einsum("uk,ukd->ud", weights, pool[rng.integers(0, len(pool), (users, 3))])
+
+    def noisy(rows):
+        return (bases[rows] * rng.gamma(20.0, 1 / 20.0, (len(rows), bases.shape[1]))).astype(np.float32)
+
+    labels = np.repeat(np.arange(users, dtype=np.int32), samples)
+    return noisy(labels), labels, noisy(np.arange(users))
+
+
+def bench_index(identities, user_counts, repeat, rng):
+    """
+    身份索引的扩展性：合成 user_counts 个身份的图库，记录粗筛（shortlist）每个探针的耗时随用户数的变化，
+    同时给出索引匹配与全量匹配的耗时、候选召回率与倒排列表数
+    """
+    params = feature_params()
+    faces = [draw_face(rng, identities[i % len(identities)], 200) for i in range(INDEX_POOL)]
+    pool = extract_histograms([cv2.equalizeHist(face) for face in faces], **params)
+
+    results = []
+    for users in user_counts:
+        histograms, labels, probes = _synthetic_gallery(pool, users, INDEX_SAMPLES, rng)
+        probes = probes[rng.choice(users, min(PROBE_COUNT, users), replace=False)]
+        matcher = LBPHMatcher(histograms, labels, **params)
+        start = time.perf_counter()
+        index = GalleryIndex(matcher)
+        build_seconds = time.perf_counter() - start
+
+        report = index.evaluate_recall(probes)
+        results.append(_result("index", {'users': users, 'samples': INDEX_SAMPLES}, len(probes),
+                               _time(lambda: index.shortlist(probes), repeat),
+                               recall=report['recall'], agreement=report['agreement'],
+                               lists=report['lists'], lists_probed=report['lists_probed'],
+                               index_ms_per_probe=report['index_ms'] / len(probes),
+                               exact_ms_per_probe=report['exact_ms'] / len(probes),
+                               build_seconds=build_seconds))
+    return results
+
+
+def bench_frames(model_dir, identities, resolutions, faces_per_frame, repeat, rng):
+    """实时帧（process_frame）与静态图片（analyze_image）的检测+识别耗时"""
+    recognizer = FaceRecognizer(model_dir)
+    recognizer.load_model()
+
+    results = []
+    for resolution in resolutions:
+        width, height = (int(v) for v in resolution.lower().split("x"))
+        for count in faces_per_frame:
+            chosen = [identities[i % len(identities)] for i in range(count)]
+            frame = make_frame(rng, chosen, width, height)
+            params = {'resolution': resolution, 'faces': count}
+
+            found = []
+            results.append(_result(
+                "frame", params, 1,
+                _time(lambda: found.append(len(recognizer.process_frame(frame.copy())[1])), repeat),
+                detected=found[-1]))
+            results.append(_result(
+                "image", params, 1,
+                _time(lambda: recognizer.analyze_image(frame.copy(), annotate=False), repeat)))
+    return results
+
+
+# -------------------- 运行与对比 --------------------
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(axes=None, repeat=3, seed=0, workers=None, work_dir=None):
+    """按各扩展维度运行全部阶段，返回可写入文件的结果 dict"""
+    axes = axes or DEFAULT_AXES
+    rng = np.random.default_rng(seed)
+    identities = [make_identity(rng) for _ in range(max(max(axes['users']), max(axes['faces'])))]
+
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="face_bench_")
+    results = []
+    try:
+        first_model = None
+        for users in axes['users']:
+            for samples in axes['samples']:
+                run_dir = os.path.join(work_dir, f"u{users}_s{samples}")
+                # 每个组合使用独立的随机流，增减其他组合不影响数据
+                run_rng = np.random.default_rng([seed, users, samples])
+                dataset_results, model_dir, processed_dir = bench_dataset(
+                    run_dir, identities[:users], samples, repeat, workers, run_rng)
+                results.extend(dataset_results)
+                results.extend(bench_predict(model_dir, processed_dir, {'users': users, 'samples': samples}, repeat))
+                results.extend(bench_profiles(run_dir, processed_dir, {'users': users, 'samples': samples},
+                                              axes.get('profiles', []), repeat))
+                results.extend(bench_encodings(run_dir, processed_dir, {'users': users, 'samples': samples},
+                                               axes.get('encodings', []), repeat))
+                first_model = first_model or model_dir
+                print(f"  用户 {users} x 样本 {samples} 完成", file=sys.stderr)
+
+        results.extend(bench_frames(first_model, identities, axes['resolutions'], axes['faces'], repeat,
+                                    np.random.default_rng([seed, 1])))
+        results.extend(bench_index(identities, axes.get('index_users', []), repeat,
+                                   np.random.default_rng([seed, 2])))
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'benchmark_version': BENCHMARK_VERSION,
+        'created': time.time(),
+        'environment': environment(),
+        'config': {'axes': axes, 'repeat': repeat, 'seed': seed, 'workers': workers},
+        'results': results,
+    }
+
+
+def _result_key(result):
+    return result['stage'] + " " + " ".join(f"{k}={v}" for k, v in sorted(result['params'].items()))
+
+
+def compare(baseline, current, tolerance=0.10):
+    """逐项对比两份结果，返回 [(名称, 基线秒, 当前秒, 比值, 是否退化)]"""
+    if baseline.get('benchmark_version') != current.get('benchmark_version'):
+        raise Exception("基准结果版本不一致，无法对比")
+
+    old = {_result_key(r): r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        key = _result_key(result)
+        if key not in old:
+            continue
+        before, after = old[key]['seconds'], result['seconds']
+        ratio = after / before if before > 0 else float("inf")
+        rows.append((key, before, after, ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def print_results(data):
+    for result in data['results']:
+        extra = " ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                         for k, v in result['extra'].items())
+        print(f"{_result_key(result):<48} {result['seconds'] * 1000:10.1f} ms "
+              f"{result['ms_per_item']:9.2f} ms/项 {result['items_per_sec']:9.1f} 项/秒  {extra}")
+
+
+def _parse_list(text, cast=int):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用合成数据测试检测、预处理、训练与识别的性能（无需摄像头和显示器）")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="结果 JSON 文件")
+    parser.add_argument("--users", help="用户数，逗号分隔，例如 5,20,80")
+    parser.add_argument("--samples", help="每个用户的样本数，逗号分隔")
+    parser.add_argument("--resolutions", help="帧分辨率，逗号分隔，例如 640x480,1920x1080")
+    parser.add_argument("--faces", help="每帧人脸数，逗号分隔")
+    parser.add_argument("--encodings", help="对比的图库编码，逗号分隔，例如 float32,uint8,pca（见 gallery_codec.ENCODINGS）")
+    parser.add_argument("--profiles", help="对比的特征配置，逗号分隔，例如 lbph,uniform（见 matcher.FEATURE_PROFILES）")
+    parser.add_argument("--index-users", help="索引扩展性测试的用户数，逗号分隔，例如 100,400,1600（空字符串跳过）")
+    parser.add_argument("--quick", action="store_true", help="使用最小的规模快速检查")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取中位数）")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据随机种子")
+    parser.add_argument("--workers", type=int, default=1, help="预处理进程数")
+    parser.add_argument("--compare", help="与之前的结果文件对比")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="对比时视为退化的变慢比例")
+    args = parser.parse_args()
+
+    axes = dict(QUICK_AXES if args.quick else DEFAULT_AXES)
+    if args.users:
+        axes['users'] = _parse_list(args.users)
+    if args.samples:
+        axes['samples'] = _parse_list(args.samples)
+    if args.resolutions:
+        axes['resolutions'] = _parse_list(args.resolutions, str)
+    if args.faces:
+        axes['faces'] = _parse_list(args.faces)
+    if args.profiles is not None:
+        axes['profiles'] = _parse_list(args.profiles, str)
+    if args.index_users is not None:
+        axes['index_users'] = _parse_list(args.index_users)
+    if args.encodings is not None:
+        axes['encodings'] = _parse_list(args.encodings, str)
+
+    data = run_benchmarks(axes, args.repeat, args.seed, args.workers)
+    print_results(data)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = 0
+        for key, before, after, ratio, regressed in compare(baseline, data, args.tolerance):
+            regressions += regressed
+            print(f"{key:<48} {before * 1000:10.1f} -> {after * 1000:10.1f} ms  x{ratio:.2f}"
+                  f"{'  ⚠ 变慢' if regressed else ''}")
+        print(f"对比完成: {regressions} 项变慢超过 {args.tolerance:.0%}")
\ No newline at end of file
@@ -1,51 +1,220 @@
 import cv2
 import os
+import queue
+import threading
+import time
 
+import numpy as np
 
-def capture_faces(user_name, num_samples=150, output_dir="data/raw"):
+import registry
+from video_source import open_capture, parse_source
+
+# 样本质量门限：清晰度为拉普拉斯方差（人脸缩放到 100x100 后计算），
+# 差异度为与已接受样本 32x32 缩略图的最小平均灰度差（0-255）
+MIN_SHARPNESS = 25.0
+MIN_DIFFERENCE = 6.0
+QUALITY_SIZE = 100
+THUMB_SIZE = 32
+WRITE_QUEUE_SIZE = 64
+# 采集预算：最多采集 NUM_SAMPLES 张；连续 MAX_STALL_FRAMES 帧没有接受新样本（用户保持不动、
+# 只剩重复或模糊的人脸）或超过 MAX_SECONDS 秒时提前结束
+NUM_SAMPLES = 150
+MAX_STALL_FRAMES = 150
+MAX_SECONDS = 60.0
+STOP_REASONS = {'complete': "已采满", 'stalled': "长时间没有新样本", 'timeout': "超过采集时长",
+                'quit': "手动结束", 'ended': "视频结束"}
+
+
+class SampleGate:
+    """
+    采集样本的质量筛选
+    模糊的人脸、与已接受样本几乎相同的连续帧不保存，使每个用户的样本更少且更多样
+    """
+
+    def __init__(self, min_sharpness=MIN_SHARPNESS, min_difference=MIN_DIFFERENCE):
+        self.min_sharpness = min_sharpness
+        self.min_difference = min_difference
+        self.accepted = 0
+        self.rejected = {'blurry': 0, 'duplicate': 0}
+        self._thumbs = []
+
+    def check(self, face_img):
+        """通过时返回 None 并记住该样本，否则返回拒绝原因（blurry / duplicate）"""
+        face = cv2.resize(face_img, (QUALITY_SIZE, QUALITY_SIZE))
+        if cv2.Laplacian(face, cv2.CV_64F).var() < self.min_sharpness:
+            self.rejected['blurry'] += 1
+            return "blurry"
+
+        # 均衡化后再比较，避免只是亮度变化的帧被当作新样本
+        thumb = cv2.resize(cv2.equalizeHist(face), (THUMB_SIZE, THUMB_SIZE),
+                           interpolation=cv2.INTER_AREA).astype(np.float32)
+        if self._thumbs:
+            differences = np.abs(np.stack(self._thumbs) - thumb).mean(axis=(1, 2))
+            if differences.min() < self.min_difference:
+                self.rejected['duplicate'] += 1
+                return "duplicate"
+
+        self._thumbs.append(thumb)
+        self.accepted += 1
+        return None
+
+
+class SampleWriter:
+    """
+    后台线程编码并写入样本图像，采集循环不等待磁盘
+    队列满时 put 阻塞，避免磁盘太慢时内存无限增长；写入失败的路径记在 failed 中
+    """
+
+    def __init__(self, queue_size=WRITE_QUEUE_SIZE):
+        self.written = 0
+        self.errors = 0
+        self.failed = set()
+        self.write_ms = 0.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="sample-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, path, image):
+        self._queue.put((path, image))
+
+    def close(self):
+        """等待队列中的样本全部写完"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, image = item
+            start = time.perf_counter()
+            try:
+                ok = cv2.imwrite(path, image)
+            except cv2.error:
+                ok = False
+            if ok:
+                self.written += 1
+            else:
+                self.errors += 1
+                self.failed.add(path)
+            self.write_ms += (time.perf_counter() - start) * 1000
+
+
+def capture_faces(user_name, num_samples=NUM_SAMPLES, output_dir="data/raw", source=0,
+                  min_sharpness=MIN_SHARPNESS, min_difference=MIN_DIFFERENCE,
+                  processed_dir=None, save_raw=True, max_stall_frames=MAX_STALL_FRAMES,
+                  max_seconds=MAX_SECONDS):
     """
     采集人脸样本
+    source 为摄像头编号、视频文件或流地址；
+    只保存足够清晰、且与已保存样本有明显差异的人脸，图像由后台线程写入。
+    采满 num_samples 张、连续 max_stall_frames 帧没有新样本或超过 max_seconds 秒时结束
+    （为 None 时不限制），统计中的 stop_reason 说明结束原因：
+    complete / stalled / timeout / quit（按 q）/ ended（视频结束）
+    processed_dir 不为空时同时把 200x200 均衡化后的人脸直接写入 processed_dir/{user}，
+    并登记到预处理清单，预处理不再对这些样本二次检测；save_raw=False 时不保存原始裁剪图。
+    返回采集统计：接受数、各原因的拒绝数、写入数、帧率等
     """
+    if processed_dir is None and not save_raw:
+        raise Exception("不保存原图时必须指定预处理输出目录")
+
     # 创建输出目录
     user_dir = os.path.join(output_dir, user_name)
-    os.makedirs(user_dir, exist_ok=True)
+    if save_raw:
+        os.makedirs(user_dir, exist_ok=True)
+    if processed_dir is not None:
+        from preprocess import normalize_face, record_captured
+        processed_user_dir = os.path.join(processed_dir, user_name)
+        os.makedirs(processed_user_dir, exist_ok=True)
 
-    # 初始化摄像头
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        raise Exception("无法打开摄像头")
+    # 初始化摄像头或视频
+    cap = open_capture(source)
 
     # 加载人脸检测器
-    face_cascade = cv2.CascadeClassifier(
-        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-    )
+    face_cascade = registry.get_cascade()
 
+    gate = SampleGate(min_sharpness, min_difference)
+    writer = SampleWriter()
+    frames = 0
+    detections = 0
+    start = time.perf_counter()
+
+    names = []
     count = 0
+    stall_frames = 0
+    stop_reason = "complete"
     try:
         while count < num_samples:
+            if max_seconds is not None and time.perf_counter() - start > max_seconds:
+                stop_reason = "timeout"
+                break
+            if max_stall_frames is not None and stall_frames >= max_stall_frames:
+                stop_reason = "stalled"
+                break
+
             ret, frame = cap.read()
             if not ret:
+                # 视频文件读完后结束，摄像头偶发读取失败则重试
+                if not isinstance(parse_source(source), int):
+                    stop_reason = "ended"
+                    break
                 continue
+            frames += 1
+            stall_frames += 1
 
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             faces = face_cascade.detectMultiScale(gray, 1.3, 5)
 
             for (x, y, w, h) in faces:
-                # 保存人脸区域
+                detections += 1
                 face_img = gray[y:y + h, x:x + w]
-                face_path = os.path.join(user_dir, f"{count}.jpg")
-                cv2.imwrite(face_path, face_img)
-                count += 1
+                accepted = count < num_samples and gate.check(face_img) is None
 
-                # 显示框
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                if accepted:
+                    name = f"{count}.jpg"
+                    if save_raw:
+                        # 保存人脸区域（复制一份，帧缓冲会被下一帧覆盖）
+                        writer.put(os.path.join(user_dir, name), face_img.copy())
+                    if processed_dir is not None:
+                        writer.put(os.path.join(processed_user_dir, name), normalize_face(face_img))
+                    names.append(name)
+                    count += 1
+                    stall_frames = 0
+
+                # 显示框：绿色为已保存，黄色为被质量筛选跳过
+                color = (0, 255, 0) if accepted else (0, 255, 255)
+                cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
                 cv2.putText(frame, f"Count: {count}/{num_samples}",
                             (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
 
             cv2.imshow("Capturing Faces - Press 'q' to quit", frame)
             if cv2.waitKey(1) & 0xFF == ord('q'):
+                stop_reason = "quit"
                 break
 
     finally:
         cap.release()
-        cv2.destroyAllWindows()
\ No newline at end of file
+        cv2.destroyAllWindows()
+        writer.close()
+
+    if processed_dir is not None:
+        # 只登记确实写入了的人脸，写入失败的样本交给预处理从原图重新生成
+        names = [name for name in names if os.path.join(processed_user_dir, name) not in writer.failed]
+        record_captured(user_name, names, output_dir, processed_dir)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'accepted': gate.accepted,
+        'rejected_blurry': gate.rejected['blurry'],
+        'rejected_duplicate': gate.rejected['duplicate'],
+        'normalized': len(names) if processed_dir is not None else 0,
+        'detections': detections,
+        'frames': frames,
+        'written': writer.written,
+        'write_errors': writer.errors,
+        'write_ms': writer.write_ms,
+        'seconds': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else 0.0,
+        'stop_reason': stop_reason,
+    }
\ No newline at end of file
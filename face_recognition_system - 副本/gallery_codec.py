@@ -0,0 +1,136 @@
+import numpy as np
+
+from matcher import LBPHMatcher, chi_square_distances
+
+# 图库的存储编码：
+#   float32  原始精度（默认）
+#   float16  半精度，内存减半，匹配时只把探针非零的列转换为 float32
+#   uint8    每行按最大值线性量化到 0-255，另存每行的量化步长 scales，内存为 1/4
+#   pca      对开方后的直方图（Hellinger 空间）做主成分分析，只保存降维后的向量与每行主成分之外的能量；
+#            距离为降维空间的平方欧氏距离加两侧的剩余能量，再按训练样本校准到卡方距离的量级，
+#            原有识别阈值仍然适用
+ENCODINGS = ("float32", "float16", "uint8", "pca")
+PCA_COMPONENTS = 128
+# 拟合主成分与校准距离时最多使用的样本数
+PCA_FIT_SAMPLES = 2000
+CALIBRATION_SAMPLES = 300
+
+
+def encode(histograms, encoding="float32", components=PCA_COMPONENTS, seed=0):
+    """
+    把 float32 直方图矩阵编码为紧凑的图库
+    返回 (图库矩阵, gallery 描述)，两者一起交给 model_store.save_model / LBPHMatcher
+    """
+    histograms = np.asarray(histograms, dtype=np.float32)
+    if encoding == "float32":
+        return histograms, {'encoding': "float32"}
+    if encoding == "float16":
+        return histograms.astype(np.float16), {'encoding': "float16"}
+    if encoding == "uint8":
+        return _quantize(histograms)
+    if encoding == "pca":
+        return _fit_pca(histograms, components, seed)
+    raise Exception(f"未知的图库编码: {encoding}")
+
+
+def _quantize(histograms):
+    scales = histograms.max(axis=1) / np.float32(255) if len(histograms) else np.empty(0, np.float32)
+    scales[scales == 0] = 1.0
+    quantized = np.rint(histograms / scales[:, np.newaxis]).astype(np.uint8)
+    return quantized, {'encoding': "uint8", 'scales': scales.astype(np.float32)}
+
+
+def fit_basis(roots, components, rng, max_samples=PCA_FIT_SAMPLES):
+    """
+    拟合主成分（样本数小于维度时通过 Gram 矩阵求解），最多使用 max_samples 行
+    返回 (均值, 主成分矩阵 (k, d))；样本全部相同时 k 为 0
+    """
+    fit = roots
+    if len(fit) > max_samples:
+        fit = roots[np.sort(rng.choice(len(fit), max_samples, replace=False))]
+
+    mean = fit.mean(axis=0, dtype=np.float64).astype(np.float32)
+    centered = fit - mean
+    gram = centered.astype(np.float64) @ centered.T.astype(np.float64)
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    order = np.argsort(eigenvalues)[::-1]
+    keep = [i for i in order[:components] if eigenvalues[i] > 1e-10]
+
+    basis = (eigenvectors[:, keep].T @ centered.astype(np.float64)) / np.sqrt(eigenvalues[keep])[:, np.newaxis]
+    return mean, basis.astype(np.float32).reshape(len(keep), roots.shape[1])
+
+
+def _fit_pca(histograms, components, seed):
+    """在开方后的直方图上拟合主成分"""
+    rng = np.random.default_rng(seed)
+    roots = np.sqrt(histograms)
+    mean, basis = fit_basis(roots, components, rng)
+    if len(basis) == 0:
+        raise Exception("样本太少，无法拟合主成分")
+
+    centered = roots - mean
+    projected = centered @ basis.T
+    residuals = np.maximum(np.einsum("ij,ij->i", centered, centered, dtype=np.float64)
+                           - np.einsum("ij,ij->i", projected, projected, dtype=np.float64), 0.0)
+
+    gallery = {'encoding': "pca", 'mean': mean, 'components': basis, 'residuals': residuals.astype(np.float32),
+               'distance_scale': _calibrate(histograms, roots, rng)}
+    return np.ascontiguousarray(projected, dtype=np.float32), gallery
+
+
+def _calibrate(histograms, roots, rng):
+    """
+    Hellinger 距离（开方直方图的平方欧氏距离）到卡方距离的比例，理论上在 2 到 4 之间：
+    取每个抽样样本在全精度下的最近邻，用两种距离之比的中位数（识别阈值落在最近邻距离附近）
+    """
+    if len(histograms) < 2:
+        return 1.0
+    picks = np.sort(rng.choice(len(histograms), min(CALIBRATION_SAMPLES, len(histograms)), replace=False))
+    chi = chi_square_distances(histograms[picks], histograms)
+    chi[np.arange(len(picks)), picks] = np.inf
+    nearest = np.argmin(chi, axis=1)
+
+    hellinger = ((roots[picks] - roots[nearest]) ** 2).sum(axis=1)
+    chi = chi[np.arange(len(picks)), nearest]
+    valid = hellinger > 0
+    if not valid.any():
+        return 1.0
+    return float(np.median(chi[valid] / hellinger[valid]))
+
+
+def gallery_bytes(histograms, gallery):
+    """图库占用的字节数（含编码附带的数组）"""
+    total = np.asarray(histograms).nbytes
+    for value in gallery.values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+    return total
+
+
+def evaluate(histograms, labels, probe_histograms, probe_labels, params, encodings=ENCODINGS,
+             components=PCA_COMPONENTS):
+    """
+    用留出探针比较各编码与全精度（float32）的识别结果
+    返回 {编码: {'accuracy', 'agreement'（与 float32 结果一致的比例）, 'bytes', 'distance_error'（相对误差）}}
+    """
+    probe_labels = np.asarray(probe_labels)
+
+    def run(encoding):
+        encoded, gallery = encode(histograms, encoding, components)
+        matches = LBPHMatcher(encoded, labels, gallery=gallery, **params).match_histograms(probe_histograms)
+        predicted = np.array([label for label, _ in matches])
+        distances = np.array([distance for _, distance in matches])
+        return predicted, distances, gallery_bytes(encoded, gallery)
+
+    reference, reference_distances, _ = run("float32")
+    results = {}
+    for encoding in encodings:
+        predicted, distances, size = run(encoding)
+        results[encoding] = {
+            'accuracy': float((predicted == probe_labels).mean()),
+            'agreement': float((predicted == reference).mean()),
+            'bytes': size,
+            'distance_error': float(np.abs(distances - reference_distances).mean()
+                                    / max(reference_distances.mean(), 1e-12)),
+        }
+    return results
\ No newline at end of file
@@ -0,0 +1,228 @@
+import math
+import time
+
+import numpy as np
+
+from gallery_codec import fit_basis
+
+# 粗筛空间：每个身份的代表直方图开方后投影到 COARSE_DIM 维主成分（近似 Hellinger 距离，
+# pca 编码的图库本身就在该空间中），维度与特征配置无关；主成分最多用 COARSE_FIT_SAMPLES 个身份拟合
+COARSE_DIM = 64
+COARSE_FIT_SAMPLES = 1000
+# 倒排列表：代表向量按 k-means 分成约 sqrt(身份数) 个列表，探针只比较列表中心与最近的 LISTS_PROBED 个列表中的身份，
+# 粗筛代价约为 O(sqrt(身份数))，再加一次与身份数无关的投影（直方图维度 × COARSE_DIM）
+LISTS_PROBED = 8
+KMEANS_ITERATIONS = 10
+# 精确重排时每组探针合并候选样本一起计算，组不宜过大（不同探针的候选互不相关）
+RERANK_GROUP = 8
+
+
+def _squared_distances(vectors, others):
+    result = (np.einsum("ij,ij->i", vectors, vectors)[:, np.newaxis]
+              + np.einsum("ij,ij->i", others, others)[np.newaxis, :] - 2.0 * (vectors @ others.T))
+    return np.maximum(result, 0.0)
+
+
+def _kmeans(vectors, count, rng):
+    """返回 (中心, 每个向量所属的列表)"""
+    centers = vectors[rng.choice(len(vectors), count, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmin(_squared_distances(vectors, centers), axis=1)
+        updated = centers.copy()
+        for cluster in range(count):
+            members = assignment == cluster
+            if members.any():
+                updated[cluster] = vectors[members].mean(axis=0)
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+    return centers, np.argmin(_squared_distances(vectors, centers), axis=1)
+
+
+def _nearest(dist, k):
+    """每行最小的 k 个下标"""
+    if k >= dist.shape[1]:
+        return np.tile(np.arange(dist.shape[1]), (len(dist), 1))
+    return np.argpartition(dist, k - 1, axis=1)[:, :k]
+
+
+class GalleryIndex:
+    """
+    按身份建立的图库索引
+    先在低维粗筛空间中选出候选身份（倒排列表，只比较最近的几个列表），再只对候选用户的样本精确重排；
+    粗筛代价约与 sqrt(用户数) 成正比，重排代价只与候选数 × 每人样本数有关
+    """
+
+    def __init__(self, matcher, num_candidates=5, representative="centroid", lists_probed=LISTS_PROBED,
+                 seed=0):
+        if representative not in ("centroid", "medoid"):
+            raise Exception(f"不支持的代表样本类型: {representative}")
+
+        self.matcher = matcher
+        self.num_candidates = num_candidates
+        self.representative = representative
+        self.lists_probed = lists_probed
+        self.seed = seed
+        self.build()
+
+    def build(self):
+        """为每个身份计算代表向量并投影到粗筛空间，再分成倒排列表"""
+        rng = np.random.default_rng(self.seed)
+        labels = self.matcher.labels
+        self.identities = np.unique(labels)
+        self.rows = {int(identity): np.flatnonzero(labels == identity) for identity in self.identities}
+
+        # 先用部分身份拟合主成分，再逐个身份投影，不保留全维度的代表直方图
+        fit = self.identities
+        if len(fit) > COARSE_FIT_SAMPLES:
+            fit = np.sort(rng.choice(fit, COARSE_FIT_SAMPLES, replace=False))
+        self._fit_coarse(np.vstack([self._representative(identity) for identity in fit])
+                         if len(fit) else np.empty((0, self.matcher.dim), dtype=np.float32), rng)
+        coarse, residuals = [], []
+        for identity in self.identities:
+            vector, residual = self.project(self._representative(identity)[np.newaxis], residuals=True)
+            coarse.append(vector[0])
+            residuals.append(residual[0])
+        self.coarse = np.vstack(coarse) if coarse else np.empty((0, self.coarse_dim), dtype=np.float32)
+        # 代表向量落在粗筛主成分之外的能量（每个身份一个数），加到粗筛距离上；
+        # medoid 是单个样本，这部分能量因身份而异，不加会明显降低召回
+        self.residuals = np.asarray(residuals, dtype=np.float64)
+
+        count = max(1, int(round(math.sqrt(len(self.identities)))))
+        if len(self.identities) <= self.num_candidates or count <= self.lists_probed:
+            # 身份很少时一个列表即可
+            self.centers = self.coarse.mean(axis=0, keepdims=True) if len(self.coarse) else self.coarse
+            self.assignment = np.zeros(len(self.identities), dtype=np.int64)
+        else:
+            self.centers, self.assignment = _kmeans(self.coarse, count, rng)
+
+    def _representative(self, identity):
+        """身份在匹配器比较空间中的代表向量：样本均值（centroid）或离均值最近的样本（medoid）"""
+        # 在匹配器的比较空间中计算（压缩编码的图库先解码）
+        vectors = self.matcher.decode(self.rows[int(identity)])
+        centroid = vectors.mean(axis=0, dtype=np.float64).astype(np.float32)
+        if self.representative == "medoid":
+            dist = self.matcher.compare(centroid[np.newaxis], vectors)[0]
+            return vectors[np.argmin(dist)]
+        return centroid
+
+    def _fit_coarse(self, representatives, rng):
+        """pca 编码的比较空间已是开方降维空间，直接使用；其他编码在开方后的代表直方图上拟合主成分"""
+        if self.matcher.encoding == "pca" or len(representatives) < 2:
+            self.mean = None
+            self.basis = None
+            self.coarse_dim = self.matcher.dim if self.matcher.encoding == "pca" else 0
+            return
+        self.mean, self.basis = fit_basis(np.sqrt(representatives), COARSE_DIM, rng, COARSE_FIT_SAMPLES)
+        self.coarse_dim = len(self.basis)
+
+    def project(self, vectors, residuals=False):
+        """
+        把比较空间中的向量（matcher.project / decode 的结果）投影到粗筛空间
+        residuals=True 时同时返回主成分之外的能量（pca 编码与未拟合主成分时为 0）
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.matcher.encoding == "pca" or self.basis is None:
+            projected = vectors if self.matcher.encoding == "pca" else np.zeros((len(vectors), 0), np.float32)
+            return (projected, np.zeros(len(vectors))) if residuals else projected
+
+        centered = np.sqrt(vectors) - self.mean
+        projected = centered @ self.basis.T
+        if not residuals:
+            return projected
+        energy = (np.einsum("ij,ij->i", centered, centered, dtype=np.float64)
+                  - np.einsum("ij,ij->i", projected, projected, dtype=np.float64))
+        return projected, np.maximum(energy, 0.0)
+
+    def __len__(self):
+        return len(self.identities)
+
+    @property
+    def num_lists(self):
+        return len(self.centers)
+
+    def shortlist(self, probe_histograms):
+        """为每个探针返回候选身份数组 (m, k)"""
+        probe_histograms = np.asarray(probe_histograms, dtype=np.float32)
+        k = min(self.num_candidates, len(self.identities))
+        if k == 0:
+            return np.empty((len(probe_histograms), 0), dtype=self.identities.dtype)
+
+        coarse = self.project(self.matcher.project(probe_histograms))
+        lists = _nearest(_squared_distances(coarse, self.centers), min(self.lists_probed, self.num_lists))
+
+        # 所有探针的候选列表合并后一次计算距离，再屏蔽不属于各自列表的身份
+        members = np.flatnonzero(np.isin(self.assignment, lists))
+        own = (self.assignment[members][np.newaxis, :, np.newaxis] == lists[:, np.newaxis, :]).any(axis=2)
+        dist = np.where(own, _squared_distances(coarse, self.coarse[members]) + self.residuals[members], np.inf)
+        if own.sum(axis=1).min() < k:
+            # 候选列表中的身份不足 k 个（列表很小）时退回比较全部身份
+            members = np.arange(len(self.identities))
+            dist = _squared_distances(coarse, self.coarse) + self.residuals
+        return self.identities[members[_nearest(dist, k)]]
+
+    def match_histograms(self, probe_histograms):
+        """先粗筛候选身份，再在候选样本中精确匹配，返回 [(label, distance), ...]"""
+        probe_histograms = np.asarray(probe_histograms, dtype=np.float32)
+        if len(probe_histograms) == 0:
+            return []
+        if len(self.identities) == 0:
+            return [(-1, float("inf"))] * len(probe_histograms)
+
+        candidates = self.shortlist(probe_histograms)
+        labels = self.matcher.labels
+
+        # 每组探针的候选样本合并为一次距离计算，每个探针只取自己候选身份中的最近样本
+        results = []
+        for start in range(0, len(probe_histograms), RERANK_GROUP):
+            group = candidates[start:start + RERANK_GROUP]
+            rows = np.concatenate([self.rows[int(identity)] for identity in np.unique(group)])
+            own = (labels[rows][np.newaxis, :, np.newaxis] == group[:, np.newaxis, :]).any(axis=2)
+            dist = np.where(own, self.matcher.distances(probe_histograms[start:start + RERANK_GROUP], rows), np.inf)
+            best = np.argmin(dist, axis=1)
+            results.extend((int(labels[rows[j]]), float(dist[i, j])) for i, j in enumerate(best))
+
+        return results
+
+    def match(self, faces):
+        """批量匹配人脸"""
+        if len(faces) == 0:
+            return []
+        return self.match_histograms(self.matcher.extract(faces))
+
+    def evaluate_recall(self, probe_histograms):
+        """
+        与精确搜索对比，评估候选召回率
+        recall: 精确最近邻的身份出现在候选列表中的比例
+        agreement: 索引结果与精确结果身份一致的比例
+        """
+        probe_histograms = np.asarray(probe_histograms, dtype=np.float32)
+        if len(probe_histograms) == 0:
+            raise Exception("没有用于评估的探针样本")
+
+        start = time.perf_counter()
+        exact = self.matcher.match_histograms(probe_histograms)
+        exact_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        indexed = self.match_histograms(probe_histograms)
+        index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        candidates = self.shortlist(probe_histograms)
+        shortlist_time = time.perf_counter() - start
+        exact_labels = np.array([label for label, _ in exact])
+        indexed_labels = np.array([label for label, _ in indexed])
+
+        return {
+            'probes': len(probe_histograms),
+            'identities': len(self.identities),
+            'num_candidates': candidates.shape[1],
+            'lists': self.num_lists,
+            'lists_probed': min(self.lists_probed, self.num_lists),
+            'recall': float((candidates == exact_labels[:, np.newaxis]).any(axis=1).mean()),
+            'agreement': float((indexed_labels == exact_labels).mean()),
+            'exact_ms': exact_time * 1000,
+            'index_ms': index_time * 1000,
+            'shortlist_ms': shortlist_time * 1000,
+        }
\ No newline at end of file
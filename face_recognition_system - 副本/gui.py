@@ -1,37 +1,69 @@
 import os
-import pickle
-import cv2
-import numpy as np
+import time
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QTextEdit, QTabWidget, QListWidget,
     QSlider, QFormLayout, QFrame, QMessageBox, QFileDialog, QProgressBar,
-    QGroupBox, QSplitter, QComboBox
+    QGroupBox, QSplitter, QComboBox, QCheckBox
 )
 from PyQt5.QtGui import QImage, QPixmap, QFont, QIcon, QPalette, QColor
-from PyQt5.QtCore import QTimer, Qt, QSize
+from PyQt5.QtCore import Qt, QSize, QObject, pyqtSignal
 
-from capture import capture_faces
-from preprocess import preprocess
-from train import train
-from recognize import FaceRecognizer
+import registry
 from utils import get_current_time
 
+# cv2、numpy 以及采集/预处理/训练/识别模块较重，在第一次用到时才导入，窗口可以先显示出来
+
+
+class FrameSignals(QObject):
+    """识别线程通过信号把结果投递到界面线程"""
+    frame_ready = pyqtSignal(object, object, float)
+    stream_ended = pyqtSignal()
+
 
 class FaceApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, started_at=None):
         super().__init__()
+        # 进程启动时间，用于统计窗口显示和首次识别耗时
+        self.started_at = started_at or time.perf_counter()
         self.setWindowTitle("智能人脸识别系统")
         self.setGeometry(100, 50, 1400, 900)
         self.setup_ui()
         self.setup_styles()
 
-        # 模块变量
-        self.recognizer = FaceRecognizer()
-        self.names = {}
+        # 模块变量（识别器在第一次用到时从注册表获取）
+        self._recognizer = None
+        self._first_frame_at = None
         self.threshold = 50
         self.current_image = None
 
+        # 实时识别流水线
+        self.pipeline = None
+        self.frame_signals = FrameSignals()
+        self.frame_signals.frame_ready.connect(self.update_frame)
+        self.frame_signals.stream_ended.connect(self.on_stream_ended)
+
+    @property
+    def recognizer(self):
+        if self._recognizer is None:
+            self._recognizer = registry.get_recognizer()
+            self._recognizer.set_threshold(self.threshold)
+        return self._recognizer
+
+    def report_startup(self):
+        """窗口显示后调用，记录启动耗时"""
+        elapsed = (time.perf_counter() - self.started_at) * 1000
+        print(f"窗口显示耗时: {elapsed:.0f} ms")
+        self.statusBar().showMessage(f"✅ 就绪（启动 {elapsed:.0f} ms）")
+
+    def _report_first_recognition(self, what, clicked_at):
+        now = time.perf_counter()
+        loads = ", ".join(f"{name.split(':')[0]} {ms:.0f} ms" for name, ms in registry.load_times.items())
+        message = (f"⏱️ [{get_current_time()}] 首次{what}: 点击后 {(now - clicked_at) * 1000:.0f} ms, "
+                   f"启动后 {(now - self.started_at):.1f} 秒 ({loads})")
+        print(message)
+        return message
+
     def setup_ui(self):
         # 设置应用图标
         self.setWindowIcon(QIcon.fromTheme("camera-web"))
@@ -200,8 +232,13 @@ class FaceApp(QMainWindow):
         btn_preprocess.setIconSize(QSize(24, 24))
         btn_preprocess.setMinimumHeight(50)
 
+        btn_preprocess_all = QPushButton("📦 批量预处理全部用户")
+        btn_preprocess_all.setIconSize(QSize(24, 24))
+        btn_preprocess_all.setMinimumHeight(50)
+
         button_layout.addWidget(btn_capture)
         button_layout.addWidget(btn_preprocess)
+        button_layout.addWidget(btn_preprocess_all)
         form_layout.addLayout(button_layout)
 
         main_layout.addWidget(form_group)
@@ -223,6 +260,7 @@ class FaceApp(QMainWindow):
         # 连接信号
         btn_capture.clicked.connect(self.do_capture)
         btn_preprocess.clicked.connect(self.do_preprocess)
+        btn_preprocess_all.clicked.connect(self.do_preprocess_all)
 
         tab.setLayout(main_layout)
         self.tabs.addTab(tab, "👥 用户管理")
@@ -241,11 +279,47 @@ class FaceApp(QMainWindow):
         main_layout.addWidget(title)
 
         # 训练按钮
+        train_btn_layout = QHBoxLayout()
         btn_train = QPushButton("🎯 开始训练模型")
         btn_train.setMinimumHeight(55)
         btn_train.setStyleSheet(
             "font-size: 16px; background: qlineargradient(x1: 0, y1: 0, x2: 0, y2: 1, stop: 0 #28a745, stop: 1 #20c997);")
-        main_layout.addWidget(btn_train)
+
+        btn_train_incremental = QPushButton("➕ 增量更新模型")
+        btn_train_incremental.setMinimumHeight(55)
+        btn_train_incremental.setStyleSheet("font-size: 16px;")
+
+        train_btn_layout.addWidget(btn_train)
+        train_btn_layout.addWidget(btn_train_incremental)
+        main_layout.addLayout(train_btn_layout)
+
+        # 特征配置（matcher.FEATURE_PROFILES），随模型保存，识别时自动使用同一配置
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(QLabel("特征配置:"))
+        self.combo_profile = QComboBox()
+        for profile, label in (("lbph", "LBPH 原始编码（256 bin/格）"),
+                               ("uniform", "均匀模式 LBP（59 bin/格）"),
+                               ("uniform16", "均匀模式 LBP, 16 邻域（243 bin/格）"),
+                               ("riu2", "旋转不变均匀模式, 16 邻域（18 bin/格）")):
+            self.combo_profile.addItem(label, profile)
+        profile_layout.addWidget(self.combo_profile)
+        # 图库编码（gallery_codec.ENCODINGS），压缩图库占用更少内存
+        profile_layout.addWidget(QLabel("图库编码:"))
+        self.combo_encoding = QComboBox()
+        for encoding, label in (("float32", "float32 全精度"),
+                                ("float16", "float16 半精度（1/2）"),
+                                ("uint8", "uint8 量化（1/4）"),
+                                ("pca", "PCA 降维（128 维）")):
+            self.combo_encoding.addItem(label, encoding)
+        profile_layout.addWidget(self.combo_encoding)
+        # 每个用户保留的原型数（prototypes.py），样本多时图库更小、匹配更快
+        profile_layout.addWidget(QLabel("原型数:"))
+        self.combo_prototypes = QComboBox()
+        for prototypes, label in ((None, "全部样本"), (5, "每人 5 个"), (10, "每人 10 个"), (20, "每人 20 个")):
+            self.combo_prototypes.addItem(label, prototypes)
+        profile_layout.addWidget(self.combo_prototypes)
+        profile_layout.addStretch()
+        main_layout.addLayout(profile_layout)
 
         # 进度条
         self.progress_train = QProgressBar()
@@ -276,7 +350,8 @@ class FaceApp(QMainWindow):
         log_layout.addWidget(self.log_train)
         main_layout.addWidget(log_group)
 
-        btn_train.clicked.connect(self.do_train)
+        btn_train.clicked.connect(lambda: self.do_train())
+        btn_train_incremental.clicked.connect(lambda: self.do_train(incremental=True))
 
         tab.setLayout(main_layout)
         self.tabs.addTab(tab, "🚀 模型训练")
@@ -313,6 +388,19 @@ class FaceApp(QMainWindow):
         btn_layout.addStretch()
         control_layout.addLayout(btn_layout)
 
+        # 视频源：摄像头编号、视频文件或流地址
+        source_layout = QHBoxLayout()
+        source_label = QLabel("📹 视频源:")
+        source_label.setFont(QFont("Microsoft YaHei", 11, QFont.Bold))
+        self.source_input = QLineEdit("0")
+        self.source_input.setPlaceholderText("摄像头编号、视频文件路径或 rtsp:// 地址")
+        btn_source = QPushButton("📂 选择视频")
+        btn_source.clicked.connect(self.select_video_source)
+        source_layout.addWidget(source_label)
+        source_layout.addWidget(self.source_input)
+        source_layout.addWidget(btn_source)
+        control_layout.addLayout(source_layout)
+
         # 阈值调节
         threshold_layout = QHBoxLayout()
         threshold_label = QLabel("🎚️ 识别阈值:")
@@ -333,6 +421,44 @@ class FaceApp(QMainWindow):
         threshold_layout.addWidget(self.lbl_threshold)
         control_layout.addLayout(threshold_layout)
 
+        # 检测+跟踪模式
+        self.chk_tracking = QCheckBox("🎯 跟踪模式（每10帧检测一次，身份按轨迹缓存）")
+        self.chk_tracking.toggled.connect(self.update_tracking)
+        control_layout.addWidget(self.chk_tracking)
+
+        # 结果缓存：同一张人脸（感知哈希相同）直接复用上次的匹配结果
+        self.chk_result_cache = QCheckBox("♻️ 缓存人脸识别结果（相同人脸跳过匹配，换模型自动失效）")
+        self.chk_result_cache.toggled.connect(self.update_result_cache)
+        control_layout.addWidget(self.chk_result_cache)
+
+        # 性能指标：叠加显示与导出
+        metrics_layout = QHBoxLayout()
+        self.chk_metrics_overlay = QCheckBox("📊 在画面上显示FPS与各阶段耗时")
+        btn_export_metrics = QPushButton("📈 导出指标 (Prometheus)")
+        btn_export_metrics.clicked.connect(self.export_metrics)
+        metrics_layout.addWidget(self.chk_metrics_overlay)
+        metrics_layout.addStretch()
+        metrics_layout.addWidget(btn_export_metrics)
+        control_layout.addLayout(metrics_layout)
+
+        # 检测分辨率与 ROI 模式
+        detection_layout = QHBoxLayout()
+        detection_label = QLabel("🔎 检测分辨率:")
+        detection_label.setFont(QFont("Microsoft YaHei", 11, QFont.Bold))
+        self.combo_detection_scale = QComboBox()
+        for text, scale in (("100% (原始)", 1.0), ("75%", 0.75), ("50%", 0.5), ("33%", 0.33)):
+            self.combo_detection_scale.addItem(text, scale)
+        self.combo_detection_scale.currentIndexChanged.connect(self.update_detection)
+
+        self.chk_roi = QCheckBox("只在上一帧人脸附近检测（每15帧全帧扫描）")
+        self.chk_roi.toggled.connect(self.update_detection)
+
+        detection_layout.addWidget(detection_label)
+        detection_layout.addWidget(self.combo_detection_scale)
+        detection_layout.addWidget(self.chk_roi)
+        detection_layout.addStretch()
+        control_layout.addLayout(detection_layout)
+
         main_layout.addWidget(control_group)
 
         # 视频显示
@@ -488,8 +614,13 @@ class FaceApp(QMainWindow):
         try:
             self.progress_user.setVisible(True)
             self.progress_user.setRange(0, 0)  # 不确定进度
-            capture_faces(user)
-            self.log_user.append(f"✅ [{get_current_time()}] 采集完成: {user}")
+            from capture import STOP_REASONS, capture_faces
+            # 采集时直接输出归一化人脸，预处理无需再次检测
+            stats = capture_faces(user, processed_dir="data/processed")
+            self.log_user.append(
+                f"✅ [{get_current_time()}] 采集完成: {user} (保存 {stats['accepted']} 张, "
+                f"模糊跳过 {stats['rejected_blurry']}, 重复跳过 {stats['rejected_duplicate']}, "
+                f"{stats['fps']:.1f} 帧/秒, {STOP_REASONS[stats['stop_reason']]})")
             self.statusBar().showMessage(f"🎉 已采集 {user} 的人脸数据")
         except Exception as e:
             self.log_user.append(f"❌ [{get_current_time()}] 采集失败: {str(e)}")
@@ -506,8 +637,9 @@ class FaceApp(QMainWindow):
         try:
             self.progress_user.setVisible(True)
             self.progress_user.setRange(0, 0)
+            from preprocess import preprocess
             count = preprocess(user)
-            self.log_user.append(f"✅ [{get_current_time()}] 预处理完成: {user} ({count}张图像)")
+            self.log_user.append(f"✅ [{get_current_time()}] 预处理完成: {user} (新保存 {count} 张人脸)")
             self.statusBar().showMessage(f"⚙️ 已预处理 {user} 的人脸数据")
         except Exception as e:
             self.log_user.append(f"❌ [{get_current_time()}] 预处理失败: {str(e)}")
@@ -515,16 +647,51 @@ class FaceApp(QMainWindow):
         finally:
             self.progress_user.setVisible(False)
 
-    def do_train(self):
+    def do_preprocess_all(self):
+        try:
+            self.progress_user.setVisible(True)
+            self.progress_user.setRange(0, 0)
+            from preprocess import preprocess_batch
+            stats = preprocess_batch()
+            for user, count in stats['users'].items():
+                self.log_user.append(f"   {user}: {count}张图像")
+            self.log_user.append(
+                f"✅ [{get_current_time()}] 批量预处理完成: {len(stats['users'])} 个用户, "
+                f"{stats['images']} 张原始图像 (新处理 {stats['processed']}, 跳过 {stats['skipped']}, "
+                f"未检出人脸 {stats['no_face']}, 采集时已归一化 {stats['captured']}), "
+                f"{stats['faces']} 张人脸, "
+                f"{stats['images_per_sec']:.1f} 张/秒 ({stats['workers']} 进程)")
+            self.statusBar().showMessage(f"⚙️ 已批量预处理 {len(stats['users'])} 个用户")
+        except Exception as e:
+            self.log_user.append(f"❌ [{get_current_time()}] 批量预处理失败: {str(e)}")
+            QMessageBox.critical(self, "❌ 错误", f"批量预处理失败: {str(e)}")
+        finally:
+            self.progress_user.setVisible(False)
+
+    def do_train(self, incremental=False):
         try:
             self.progress_train.setVisible(True)
             self.progress_train.setRange(0, 0)
-            self.names = train()
+            from train import train
+            profile = self.combo_profile.currentData()
+            encoding = self.combo_encoding.currentData()
+            prototypes = self.combo_prototypes.currentData()
+            stats = {}
+            names = train(incremental=incremental, profile=profile, encoding=encoding,
+                          prototypes=prototypes, stats=stats)
             self.user_list.clear()
-            for k, v in self.names.items():
+            for k, v in names.items():
                 self.user_list.addItem(f"👤 ID={k}, 姓名={v}")
-            self.log_train.append(f"✅ [{get_current_time()}] 模型训练完成, 共 {len(self.names)} 个用户")
-            self.lbl_stats.setText(f"📊 已训练: {len(self.names)} 用户")
+            mode = "增量更新" if incremental else "模型训练"
+            self.log_train.append(f"✅ [{get_current_time()}] {mode}完成, 共 {len(names)} 个用户 (特征配置 {profile}, 图库编码 {encoding})")
+            if prototypes:
+                self.log_train.append(f"    原型选择: 本次提取 {stats['samples']} 个样本, 保留 {stats['prototypes']} 个原型, "
+                                      f"图库共 {stats['gallery']} 行")
+            # 正在实时识别时新模型在后台加载后直接替换，无需重新打开摄像头
+            if self.pipeline is not None and self._recognizer is not None:
+                self.recognizer.reload_if_changed(wait=False)
+                self.log_recog.append(f"🔄 [{get_current_time()}] 新模型已发布，将在后台加载并替换")
+            self.lbl_stats.setText(f"📊 已训练: {len(names)} 用户")
             self.statusBar().showMessage("🎯 模型训练完成")
         except Exception as e:
             self.log_train.append(f"❌ [{get_current_time()}] 训练失败: {str(e)}")
@@ -534,32 +701,71 @@ class FaceApp(QMainWindow):
 
     def start_recognition(self):
         try:
-            self.recognizer.start_recognition(self.threshold, self.names)
-            self.log_recog.append(f"▶️ [{get_current_time()}] 开始实时识别...")
+            from pipeline import RecognitionPipeline
+
+            self._first_frame_at = time.perf_counter()
+            self.stop_pipeline()
+            source = self.source_input.text().strip() or "0"
+            self.recognizer.start_recognition(self.threshold, source)
+            self.log_recog.append(f"▶️ [{get_current_time()}] 开始实时识别... (视频源: {source})")
             self.statusBar().showMessage("🔍 实时识别中...")
 
-            # 启动定时器更新画面
-            self.timer = QTimer()
-            self.timer.timeout.connect(self.update_frame)
-            self.timer.start(30)
+            # 读取与识别在后台线程进行，界面只负责显示
+            self.pipeline = RecognitionPipeline(
+                self.recognizer, self.recognizer.cap, self.frame_signals.frame_ready.emit,
+                self.frame_signals.stream_ended.emit, source)
+            self.pipeline.start()
 
         except Exception as e:
             self.log_recog.append(f"❌ [{get_current_time()}] 启动识别失败: {str(e)}")
             QMessageBox.critical(self, "❌ 错误", f"启动识别失败: {str(e)}")
 
+    def select_video_source(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择视频", "", "视频文件 (*.mp4 *.avi *.mkv *.mov *.flv *.wmv);;所有文件 (*)")
+        if file_path:
+            self.source_input.setText(file_path)
+
+    def stop_pipeline(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
     def stop_recognition(self):
-        self.recognizer.stop_recognition()
-        if hasattr(self, 'timer'):
-            self.timer.stop()
+        self.stop_pipeline()
+        if self._recognizer is not None:
+            self._recognizer.stop_recognition()
         self.video_label.clear()
         self.video_label.setText("🎥 视频预览区域\n\n点击\"开始实时识别\"启动摄像头")
         self.log_recog.append(f"⏹️ [{get_current_time()}] 识别已停止")
         self.statusBar().showMessage("🛑 识别已停止")
 
-    def update_frame(self):
-        frame = self.recognizer.get_frame_with_detection()
-        if frame is not None:
-            # 显示到 QLabel
+    def on_stream_ended(self):
+        """视频文件播放完毕"""
+        if self.pipeline is None:
+            return
+        stats = self.pipeline.stats()
+        self.log_recog.append(f"🏁 [{get_current_time()}] 视频播放完毕, 共处理 {stats['frames_processed']} 帧")
+        self.stop_recognition()
+
+    def update_frame(self, frame, results, latency_ms):
+        # 停止后仍在队列中的帧直接丢弃
+        if self.pipeline is None:
+            return
+
+        import cv2
+
+        if self._first_frame_at is not None:
+            self.log_recog.append(self._report_first_recognition("实时识别", self._first_frame_at))
+            self._first_frame_at = None
+
+        metrics = self.recognizer.metrics
+        if self.chk_metrics_overlay.isChecked():
+            for i, line in enumerate(metrics.overlay_lines()):
+                cv2.putText(frame, line, (10, 20 + i * 18), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+        # 显示到 QLabel
+        with metrics.timer("display"):
             rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             h, w, ch = rgb.shape
             bytes_per_line = ch * w
@@ -571,10 +777,48 @@ class FaceApp(QMainWindow):
                 Qt.SmoothTransformation
             ))
 
+        stats = self.pipeline.stats()
+        self.statusBar().showMessage(
+            f"🔍 实时识别中... {len(results)} 个人脸 | 延迟 {latency_ms:.0f} ms "
+            f"(平均 {stats['avg_latency_ms']:.0f} ms) | 丢弃旧帧 {stats['frames_dropped']}")
+
+    def export_metrics(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出指标", "metrics.prom", "Prometheus 文本 (*.prom *.txt)")
+        if not file_path:
+            return
+        try:
+            self.recognizer.metrics.write_prometheus(file_path)
+            self.log_recog.append(f"📈 [{get_current_time()}] 指标已导出: {file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "❌ 错误", f"导出指标失败: {str(e)}")
+
     def update_threshold(self):
         self.threshold = self.slider.value()
         self.lbl_threshold.setText(f"{self.threshold} (值越小越严格)")
-        self.recognizer.set_threshold(self.threshold)
+        if self._recognizer is not None:
+            self._recognizer.set_threshold(self.threshold)
+
+    def update_tracking(self, enabled):
+        self.recognizer.set_tracking(enabled)
+        mode = "跟踪模式" if enabled else "逐帧检测模式"
+        self.log_recog.append(f"⚙️ [{get_current_time()}] 已切换为{mode}")
+
+    def update_result_cache(self, enabled):
+        recognizer = self.recognizer
+        if not enabled and recognizer.result_cache is not None:
+            stats = recognizer.result_cache.stats()
+            self.log_recog.append(f"♻️ [{get_current_time()}] 结果缓存: 命中 {stats['hits']}, "
+                                  f"未命中 {stats['misses']}, 命中率 {stats['hit_rate']:.0%}")
+        recognizer.set_result_cache(enabled)
+        self.log_recog.append(f"⚙️ [{get_current_time()}] 结果缓存已{'开启' if enabled else '关闭'}")
+
+    def update_detection(self):
+        scale = self.combo_detection_scale.currentData()
+        roi_mode = self.chk_roi.isChecked()
+        self.recognizer.set_detection(scale, roi_mode)
+        self.log_recog.append(
+            f"⚙️ [{get_current_time()}] 检测分辨率 {scale:.0%}, ROI 模式 {'开启' if roi_mode else '关闭'}")
 
     def update_image_threshold(self):
         threshold = self.slider_image.value()
@@ -632,6 +876,11 @@ class FaceApp(QMainWindow):
             return
 
         try:
+            import cv2
+
+            clicked_at = time.perf_counter()
+            first = self._recognizer is None or self.recognizer.matcher is None
+
             # 设置阈值
             threshold = self.slider_image.value()
             self.recognizer.set_threshold(threshold)
@@ -672,6 +921,8 @@ class FaceApp(QMainWindow):
 
             self.lbl_result.setText(result_text)
             self.statusBar().showMessage(f"✅ 图片识别完成 - 检测到 {len(results)} 个人脸")
+            if first:
+                self._report_first_recognition("图片识别", clicked_at)
 
         except Exception as e:
             error_msg = f"❌ 识别错误: {str(e)}"
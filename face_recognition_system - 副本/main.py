@@ -1,7 +1,12 @@
 #主程序入口
+import time
+
+STARTED_AT = time.perf_counter()
+
 import sys
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QFont
+from PyQt5.QtCore import QTimer
 from gui import FaceApp
 
 if __name__ == "__main__":
@@ -11,6 +16,8 @@ if __name__ == "__main__":
     font = QFont("Microsoft YaHei", 12)
     app.setFont(font)
 
-    win = FaceApp()
+    win = FaceApp(STARTED_AT)
     win.show()
+    # 事件循环开始处理后窗口才真正显示出来
+    QTimer.singleShot(0, win.report_startup)
     sys.exit(app.exec_())
\ No newline at end of file
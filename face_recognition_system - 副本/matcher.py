@@ -0,0 +1,399 @@
+import numpy as np
+
+# 特征配置：训练与识别必须使用同一配置，配置（params）随模型一起保存，识别时按模型中的配置提取
+# mapping 为 LBP 编码映射：
+#   none     原始编码，每格 2^neighbors 个 bin（与 OpenCV LBPHFaceRecognizer 一致）
+#   uniform  均匀模式（圆周上 0/1 跳变不超过 2 次）各占一个 bin，其余合并为一个，每格 P(P-1)+3 个 bin
+#   riu2     旋转不变均匀模式，按 1 的个数合并，每格 P+2 个 bin
+FEATURE_PROFILES = {
+    'lbph': {'radius': 1, 'neighbors': 8, 'grid_x': 8, 'grid_y': 8, 'mapping': "none"},
+    'uniform': {'radius': 1, 'neighbors': 8, 'grid_x': 8, 'grid_y': 8, 'mapping': "uniform"},
+    'uniform16': {'radius': 2, 'neighbors': 16, 'grid_x': 8, 'grid_y': 8, 'mapping': "uniform"},
+    'riu2': {'radius': 2, 'neighbors': 16, 'grid_x': 8, 'grid_y': 8, 'mapping': "riu2"},
+}
+DEFAULT_PROFILE = "lbph"
+MAPPINGS = ("none", "uniform", "riu2")
+# 不同配置的卡方距离量级不同（bin 越少距离越小），识别阈值与相似度（100 - 距离）按 lbph 的距离设定；
+# 其他配置训练时用 CALIBRATION_SAMPLES 张人脸校准换算系数 profile_scale（见 profile_distance_scale）
+CALIBRATION_SAMPLES = 200
+
+_mapping_tables = {}
+
+
+def feature_params(profile=DEFAULT_PROFILE):
+    """按名称取特征配置（返回副本）"""
+    if profile not in FEATURE_PROFILES:
+        raise Exception(f"未知的特征配置: {profile}")
+    return dict(FEATURE_PROFILES[profile])
+
+
+def _transitions(code, neighbors):
+    """圆周上相邻位 0/1 跳变次数"""
+    rotated = (code >> 1) | ((code & 1) << (neighbors - 1))
+    return bin(code ^ rotated).count("1")
+
+
+def mapping_table(neighbors, mapping="none"):
+    """
+    LBP 编码到直方图 bin 的映射表，返回 (表, bin 数)；mapping 为 none 时表为 None
+    """
+    if mapping == "none":
+        return None, 2 ** neighbors
+    if mapping not in MAPPINGS:
+        raise Exception(f"未知的LBP映射: {mapping}")
+
+    key = (neighbors, mapping)
+    if key not in _mapping_tables:
+        table = np.empty(2 ** neighbors, dtype=np.int64)
+        if mapping == "uniform":
+            next_bin = 0
+            for code in range(2 ** neighbors):
+                if _transitions(code, neighbors) <= 2:
+                    table[code] = next_bin
+                    next_bin += 1
+                else:
+                    table[code] = -1
+            table[table < 0] = next_bin
+            num_bins = next_bin + 1
+        else:
+            for code in range(2 ** neighbors):
+                table[code] = bin(code).count("1") if _transitions(code, neighbors) <= 2 else neighbors + 1
+            num_bins = neighbors + 2
+        _mapping_tables[key] = (table, num_bins)
+    return _mapping_tables[key]
+
+
+def histogram_size(params):
+    """按特征配置计算直方图维度"""
+    _, num_bins = mapping_table(params['neighbors'], params.get('mapping', "none"))
+    return params['grid_x'] * params['grid_y'] * num_bins
+
+
+def _elbp(src, radius, neighbors):
+    """
+    扩展LBP编码（与 OpenCV lbph_faces.cpp 中的 elbp 一致）
+    src: (..., h, w) 灰度图像批量
+    """
+    src = src.astype(np.float32)
+    h, w = src.shape[-2:]
+    center = src[..., radius:h - radius, radius:w - radius]
+    codes = np.zeros(center.shape, dtype=np.int64)
+    eps = np.finfo(np.float32).eps
+
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / float(neighbors)))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / float(neighbors)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty = y - np.float32(fy)
+        tx = x - np.float32(fx)
+        w1 = (np.float32(1) - tx) * (np.float32(1) - ty)
+        w2 = tx * (np.float32(1) - ty)
+        w3 = (np.float32(1) - tx) * ty
+        w4 = tx * ty
+
+        def shifted(dy, dx):
+            return src[..., radius + dy:h - radius + dy, radius + dx:w - radius + dx]
+
+        t = (w1 * shifted(fy, fx) + w2 * shifted(fy, cx)
+             + w3 * shifted(cy, fx) + w4 * shifted(cy, cx))
+        codes += ((t > center) | (np.abs(t - center) < eps)).astype(np.int64) << n
+
+    return codes
+
+
+def _spatial_histogram(codes, num_patterns, grid_x, grid_y):
+    """按网格统计归一化的LBP直方图，返回 (batch, grid_x * grid_y * num_patterns)"""
+    batch = codes.shape[0]
+    rows, cols = codes.shape[1:]
+    cell_h = rows // grid_y
+    cell_w = cols // grid_x
+    num_cells = grid_x * grid_y
+
+    if cell_h == 0 or cell_w == 0:
+        return np.zeros((batch, num_cells * num_patterns), dtype=np.float32)
+
+    # 与 OpenCV 一样丢弃网格之外的边缘像素
+    cells = codes[:, :grid_y * cell_h, :grid_x * cell_w]
+    cells = cells.reshape(batch, grid_y, cell_h, grid_x, cell_w)
+    cells = cells.transpose(0, 1, 3, 2, 4).reshape(batch, num_cells, cell_h * cell_w)
+
+    offsets = (np.arange(batch * num_cells, dtype=np.int64) * num_patterns).reshape(batch, num_cells, 1)
+    hist = np.bincount((cells + offsets).ravel(), minlength=batch * num_cells * num_patterns)
+    hist = hist.reshape(batch, num_cells * num_patterns).astype(np.float32)
+    hist /= np.float32(cell_h * cell_w)
+    return hist
+
+
+def extract_histograms(faces, radius=1, neighbors=8, grid_x=8, grid_y=8, mapping="none"):
+    """
+    批量提取LBPH特征直方图
+    faces: 灰度人脸列表或 (batch, h, w) 数组，尺寸不一致时逐张提取
+    mapping: LBP 编码映射（none / uniform / riu2），见 FEATURE_PROFILES
+    """
+    if not isinstance(faces, np.ndarray) and len({np.shape(face) for face in faces}) > 1:
+        return np.vstack([extract_histograms(face, radius, neighbors, grid_x, grid_y, mapping) for face in faces])
+
+    faces = np.asarray(faces)
+    if faces.ndim == 2:
+        faces = faces[np.newaxis]
+
+    table, num_bins = mapping_table(neighbors, mapping)
+    codes = _elbp(faces, radius, neighbors)
+    if table is not None:
+        codes = table[codes]
+    return _spatial_histogram(codes, num_bins, grid_x, grid_y)
+
+
+def inverse_histograms(histograms):
+    """直方图逐元素取倒数（零值对应无穷大）"""
+    with np.errstate(divide="ignore"):
+        return np.float32(1) / np.asarray(histograms, dtype=np.float32)
+
+
+def chi_square_distances(probes, gallery, gallery_sums=None, rows=None, chunk_elements=1 << 22,
+                         gallery_scales=None):
+    """
+    计算卡方距离矩阵（等价于 cv2.HISTCMP_CHISQR_ALT）
+    probes: (m, d)，gallery: (n, d)，返回 (m, n)；rows 指定只比较图库中的部分行
+    gallery 可以是 float16，或配合 gallery_scales（每行的量化步长）使用的 uint8 量化直方图，
+    只有探针非零的列会被反量化
+
+    利用 (a-b)^2/(a+b) = (a+b) - 4ab/(a+b) 以及 ab/(a+b) = 1/(1/a + 1/b)：
+    任一方为零时调和项自然为零，因此只需读取探针非零的列，
+    图库本身（可能是内存映射）不会被整体复制
+    """
+    probes = np.asarray(probes, dtype=np.float32)
+    if gallery_sums is None:
+        gallery_sums = np.asarray(gallery, dtype=np.float32).sum(axis=1, dtype=np.float64)
+        if gallery_scales is not None:
+            gallery_sums = gallery_sums * gallery_scales
+    if rows is not None:
+        gallery = np.take(gallery, rows, axis=0)
+        gallery_sums = gallery_sums[rows]
+        if gallery_scales is not None:
+            gallery_scales = gallery_scales[rows]
+    m = probes.shape[0]
+    n = gallery.shape[0]
+
+    support = np.flatnonzero(probes.any(axis=0))
+    sub_gallery = np.take(gallery, support, axis=1).astype(np.float32)
+    if gallery_scales is not None:
+        sub_gallery *= np.asarray(gallery_scales, dtype=np.float32)[:, np.newaxis]
+    sub_gallery = inverse_histograms(sub_gallery)
+    sub_probes = inverse_histograms(probes[:, support])
+    probe_sums = probes.sum(axis=1, dtype=np.float64)
+
+    harmonic = np.empty((m, n), dtype=np.float64)
+    step = max(1, chunk_elements // max(1, m * len(support)))
+    buffer = np.empty((m, min(step, n), len(support)), dtype=np.float32)
+    for start in range(0, n, step):
+        block = sub_gallery[start:start + step]
+        terms = buffer[:, :len(block)]
+        np.add(sub_probes[:, np.newaxis, :], block[np.newaxis, :, :], out=terms)
+        np.reciprocal(terms, out=terms)
+        harmonic[:, start:start + step] = terms.sum(axis=2, dtype=np.float64)
+
+    result = 2.0 * (probe_sums[:, np.newaxis] + gallery_sums[np.newaxis, :]) - 8.0 * harmonic
+    return np.maximum(result, 0.0)
+
+
+def projected_distances(probes, gallery, gallery_norms=None, scale=1.0, probe_residuals=None,
+                        gallery_residuals=None):
+    """
+    降维空间中的平方欧氏距离乘以校准系数 scale（使其与卡方距离量级相当），返回 (m, n)
+    residuals 为各向量落在主成分之外的能量，加上后近似原空间中的距离
+    """
+    probes = np.asarray(probes, dtype=np.float32)
+    gallery = np.asarray(gallery, dtype=np.float32)
+    if gallery_norms is None:
+        gallery_norms = np.einsum("ij,ij->i", gallery, gallery, dtype=np.float64)
+    probe_norms = np.einsum("ij,ij->i", probes, probes, dtype=np.float64)
+    result = probe_norms[:, np.newaxis] + gallery_norms[np.newaxis, :] - 2.0 * (probes @ gallery.T)
+    result = np.maximum(result, 0.0)
+    if probe_residuals is not None:
+        result += probe_residuals[:, np.newaxis]
+    if gallery_residuals is not None:
+        result += gallery_residuals[np.newaxis, :]
+    return result * scale
+
+
+def profile_distance_scale(faces, params, seed=0):
+    """
+    把 params 配置的卡方距离换算到 lbph 配置量级的系数
+    在同一批人脸上取每张人脸在 lbph 下的最近邻，用两种配置下该对人脸距离之比的中位数
+    （识别阈值落在最近邻距离附近，与 pca 编码的校准方法相同）；lbph 配置本身为 1
+    """
+    reference = feature_params(DEFAULT_PROFILE)
+    if dict({'mapping': "none"}, **params) == reference or len(faces) < 2:
+        return 1.0
+
+    faces = np.asarray(faces)
+    if len(faces) > CALIBRATION_SAMPLES:
+        rng = np.random.default_rng(seed)
+        faces = faces[np.sort(rng.choice(len(faces), CALIBRATION_SAMPLES, replace=False))]
+
+    rows = np.arange(len(faces))
+    reference_dist = chi_square_distances(*[extract_histograms(faces, **reference)] * 2)
+    reference_dist[rows, rows] = np.inf
+    nearest = np.argmin(reference_dist, axis=1)
+    profile_dist = chi_square_distances(*[extract_histograms(faces, **params)] * 2)[rows, nearest]
+
+    valid = profile_dist > 0
+    if not valid.any():
+        return 1.0
+    return float(np.median(reference_dist[rows, nearest][valid] / profile_dist[valid]))
+
+
+class LBPHMatcher:
+    """
+    LBPH批量匹配器
+    所有训练直方图保存在一个连续矩阵中，一次调用即可匹配一批人脸
+    gallery 描述图库的存储编码（见 gallery_codec）：float32（默认）、float16、uint8（附每行 scales）
+    或 pca（附 mean / components / distance_scale，图库为降维后的向量，直接在降维空间中比较）；
+    gallery 中的 profile_scale 把非 lbph 配置的距离换算到 lbph 量级（没有时为 1）
+    """
+
+    def __init__(self, histograms, labels, radius=1, neighbors=8, grid_x=8, grid_y=8,
+                 histogram_sums=None, mapping="none", gallery=None):
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.mapping = mapping
+        self.gallery = gallery or {'encoding': "float32"}
+        self.encoding = self.gallery['encoding']
+        self.profile_scale = float(self.gallery.get('profile_scale', 1.0))
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+
+        # 压缩编码的图库保持原 dtype，不在加载时展开
+        histograms = np.asarray(histograms, dtype=np.float32 if self.encoding in ("float32", "pca") else None)
+        if histograms.size == 0:
+            histograms = histograms.reshape(0, self.dim)
+        self.histograms = np.ascontiguousarray(histograms)
+
+        # 行和（pca 为行的平方范数）可以随模型一起保存，避免加载时扫描整个（内存映射的）图库
+        if histogram_sums is None:
+            if self.encoding == "pca":
+                histogram_sums = np.einsum("ij,ij->i", self.histograms, self.histograms, dtype=np.float64)
+            else:
+                histogram_sums = self.histograms.sum(axis=1, dtype=np.float64)
+                if self.encoding == "uint8":
+                    histogram_sums = histogram_sums * self.gallery['scales']
+        self.histogram_sums = np.asarray(histogram_sums, dtype=np.float64)
+
+        if len(self.labels) != len(self.histograms):
+            raise Exception("直方图数量与标签数量不一致")
+        if self.histograms.shape[1] != self.dim:
+            raise Exception("直方图维度与特征配置不一致")
+
+    @property
+    def dim(self):
+        """图库向量的维度（pca 为降维后的维度）"""
+        if self.encoding == "pca":
+            return len(self.gallery['components'])
+        return histogram_size(self.params)
+
+    @property
+    def params(self):
+        """特征配置（radius / neighbors / grid_x / grid_y / mapping）"""
+        return {'radius': self.radius, 'neighbors': self.neighbors,
+                'grid_x': self.grid_x, 'grid_y': self.grid_y, 'mapping': self.mapping}
+
+    @classmethod
+    def from_recognizer(cls, recognizer):
+        """从已训练/已加载的 cv2.face.LBPHFaceRecognizer 构建匹配器"""
+        histograms = recognizer.getHistograms()
+        if len(histograms) > 0:
+            histograms = np.vstack([h.reshape(1, -1) for h in histograms])
+        else:
+            histograms = np.empty((0, 0), dtype=np.float32)
+
+        return cls(
+            histograms,
+            recognizer.getLabels(),
+            radius=recognizer.getRadius(),
+            neighbors=recognizer.getNeighbors(),
+            grid_x=recognizer.getGridX(),
+            grid_y=recognizer.getGridY(),
+        )
+
+    def __len__(self):
+        return len(self.labels)
+
+    def extract(self, faces):
+        """使用与图库相同的参数提取直方图"""
+        return extract_histograms(faces, self.radius, self.neighbors, self.grid_x, self.grid_y, self.mapping)
+
+    def project(self, probe_histograms, residuals=False):
+        """
+        把直方图变换到图库的比较空间：pca 编码为开方后的降维向量，其他编码原样返回
+        residuals=True 时同时返回 pca 主成分之外的能量
+        """
+        probe_histograms = np.asarray(probe_histograms, dtype=np.float32)
+        if self.encoding != "pca":
+            return (probe_histograms, None) if residuals else probe_histograms
+
+        centered = np.sqrt(probe_histograms) - self.gallery['mean']
+        projected = centered @ self.gallery['components'].T
+        if not residuals:
+            return projected
+        energy = (np.einsum("ij,ij->i", centered, centered, dtype=np.float64)
+                  - np.einsum("ij,ij->i", projected, projected, dtype=np.float64))
+        return projected, np.maximum(energy, 0.0)
+
+    def decode(self, rows=None):
+        """取出（部分）图库样本在比较空间中的 float32 表示"""
+        vectors = self.histograms if rows is None else np.take(self.histograms, rows, axis=0)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.encoding == "uint8":
+            scales = self.gallery['scales'] if rows is None else self.gallery['scales'][rows]
+            vectors = vectors * np.asarray(scales, dtype=np.float32)[:, np.newaxis]
+        return vectors
+
+    def compare(self, vectors, others, other_sums=None):
+        """比较空间中两组向量（project / decode 的结果或其均值）之间的距离矩阵"""
+        if self.encoding == "pca":
+            dist = projected_distances(vectors, others, other_sums, self.gallery['distance_scale'])
+        else:
+            dist = chi_square_distances(vectors, others, other_sums)
+        return dist * self.profile_scale if self.profile_scale != 1.0 else dist
+
+    def distances(self, probe_histograms, rows=None):
+        """返回探针与图库样本的距离矩阵（lbph 量级），rows 指定只比较部分样本"""
+        dist = self._raw_distances(probe_histograms, rows)
+        return dist * self.profile_scale if self.profile_scale != 1.0 else dist
+
+    def _raw_distances(self, probe_histograms, rows):
+        if self.encoding == "pca":
+            sums = self.histogram_sums if rows is None else self.histogram_sums[rows]
+            gallery = self.histograms if rows is None else np.take(self.histograms, rows, axis=0)
+            gallery_residuals = self.gallery.get('residuals')
+            if rows is not None and gallery_residuals is not None:
+                gallery_residuals = gallery_residuals[rows]
+            projected, residuals = self.project(probe_histograms, residuals=True)
+            return projected_distances(projected, gallery, sums, self.gallery['distance_scale'],
+                                       residuals, gallery_residuals)
+        return chi_square_distances(probe_histograms, self.histograms, self.histogram_sums, rows,
+                                    gallery_scales=self.gallery.get('scales'))
+
+    def match_histograms(self, probe_histograms):
+        """匹配已提取的直方图，返回 [(label, distance), ...]"""
+        probe_histograms = np.asarray(probe_histograms, dtype=np.float32)
+        if len(probe_histograms) == 0:
+            return []
+        if len(self.labels) == 0:
+            return [(-1, float("inf"))] * len(probe_histograms)
+
+        dist = self.distances(probe_histograms)
+        best = np.argmin(dist, axis=1)
+        return [(int(self.labels[j]), float(dist[i, j])) for i, j in enumerate(best)]
+
+    def match(self, faces):
+        """
+        批量匹配人脸
+        结果与逐个调用 LBPHFaceRecognizer.predict 相同
+        """
+        if len(faces) == 0:
+            return []
+        return self.match_histograms(self.extract(faces))
\ No newline at end of file
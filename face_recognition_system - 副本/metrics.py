@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# 实时识别各阶段名称（按处理顺序）
+STAGES = ("read", "convert", "detect", "preprocess", "predict", "draw", "display")
+COUNTERS = ("frames", "faces", "unknowns", "frames_dropped")
+QUANTILES = (0.5, 0.9, 0.99)
+METRIC_PREFIX = "face_recognition"
+
+
+class RollingHistogram:
+    """最近 window 个观测值的滑动窗口，另外累计总次数与总和"""
+
+    def __init__(self, window=500):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, quantiles=QUANTILES):
+        if not self.values:
+            return [0.0] * len(quantiles)
+        return [float(v) for v in np.quantile(np.fromiter(self.values, float), quantiles)]
+
+    def mean(self):
+        return sum(self.values) / len(self.values) if self.values else 0.0
+
+
+class Metrics:
+    """
+    识别热路径的分阶段耗时与计数器
+    耗时以毫秒记录在滑动窗口直方图中，可导出为 Prometheus 文本格式（文件或本地 HTTP 端点）
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self.histograms = {}
+        self.counters = {name: 0 for name in COUNTERS}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def observe(self, stage, ms):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram(self.window)
+            histogram.observe(ms)
+
+    @contextmanager
+    def timer(self, stage):
+        """with metrics.timer("detect"): ... 记录一段代码的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - start) * 1000)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {name: 0 for name in COUNTERS}
+            self.started = time.time()
+
+    def snapshot(self):
+        """每个阶段的 p50/p90/p99/平均耗时（毫秒）与计数器"""
+        with self._lock:
+            stages = {}
+            for stage, histogram in self.histograms.items():
+                p50, p90, p99 = histogram.quantiles()
+                stages[stage] = {'p50': p50, 'p90': p90, 'p99': p99,
+                                 'avg': histogram.mean(), 'count': histogram.count}
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+    def overlay_lines(self):
+        """GUI 叠加显示用的简短文本"""
+        snapshot = self.snapshot()
+        stages = snapshot['stages']
+        lines = []
+        total = sum(stages[stage]['avg'] for stage in STAGES if stage in stages and stage != "read")
+        if total > 0:
+            lines.append(f"FPS {1000.0 / total:.1f}  total {total:.1f} ms")
+        for stage in STAGES:
+            if stage in stages:
+                item = stages[stage]
+                lines.append(f"{stage:<10} p50 {item['p50']:6.1f}  p99 {item['p99']:6.1f} ms")
+        counters = snapshot['counters']
+        lines.append(f"faces {counters.get('faces', 0)}  unknown {counters.get('unknowns', 0)}  "
+                     f"dropped {counters.get('frames_dropped', 0)}")
+        return lines
+
+    def to_prometheus(self):
+        """导出为 Prometheus 文本格式：每阶段一个 summary（滑动窗口分位数 + 累计 sum/count），计数器为 counter"""
+        with self._lock:
+            lines = [
+                f"# HELP {METRIC_PREFIX}_stage_latency_ms Per-stage latency of the recognition hot path.",
+                f"# TYPE {METRIC_PREFIX}_stage_latency_ms summary",
+            ]
+            for stage, histogram in sorted(self.histograms.items()):
+                for quantile, value in zip(QUANTILES, histogram.quantiles()):
+                    lines.append(f'{METRIC_PREFIX}_stage_latency_ms{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+                lines.append(f'{METRIC_PREFIX}_stage_latency_ms_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{METRIC_PREFIX}_stage_latency_ms_count{{stage="{stage}"}} {histogram.count}')
+
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+                lines.append(f"{METRIC_PREFIX}_{name}_total {value}")
+
+            lines.append(f"# TYPE {METRIC_PREFIX}_start_time_seconds gauge")
+            lines.append(f"{METRIC_PREFIX}_start_time_seconds {self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """写入文本文件（先写临时文件再替换，适合 node_exporter 的 textfile 采集）"""
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(path + ".tmp", path)
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """在后台线程启动 /metrics 端点"""
+        if self._server is not None:
+            return self._server
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        return self._server
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self._server = None
\ No newline at end of file
@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+# 二进制模型目录结构：
+#   CURRENT             当前版本的子目录名，整体替换写入，读取方据此找到完整的一版模型
+#   gen-000001/         每次保存写入一个新的版本子目录，写完后才切换 CURRENT
+#     header.json       格式版本、特征配置（LBPH参数与编码映射）、样本数/维度、标签ID -> 用户名
+#     histograms.npy    (n, d) 图库矩阵，加载时内存映射；默认 float32 直方图，
+#                       压缩编码时为 float16 / uint8 直方图或 pca 降维向量（见 gallery_codec）
+#     labels.npy        (n,) int32 每个样本的标签ID
+#     sums.npy          (n,) float64 每行直方图之和（pca 为平方范数），匹配时使用
+#     scales.npy        uint8 编码的每行量化步长
+#     pca_mean.npy / pca_components.npy / pca_residuals.npy   pca 编码的均值、主成分与每行剩余能量
+# 早期版本的文件直接放在 lbph_model/ 下（没有 CURRENT），仍可读取
+MODEL_DIR = "lbph_model"
+LEGACY_MODEL_PATH = "lbph_model.yml"
+LEGACY_LABELS_PATH = "labels.pkl"
+FORMAT_NAME = "lbph-binary"
+# 版本 2 起特征配置中包含 LBP 编码映射（mapping），版本 1 的模型按原始编码（none）读取；
+# 版本 3 起头文件包含图库编码（gallery），没有该字段的按 float32 读取
+# gallery 中的 profile_scale 为非 lbph 特征配置的距离换算系数（matcher.profile_distance_scale），没有时为 1
+FORMAT_VERSION = 3
+
+HEADER_FILE = "header.json"
+HISTOGRAMS_FILE = "histograms.npy"
+LABELS_FILE = "labels.npy"
+SUMS_FILE = "sums.npy"
+# 图库编码附带的数组：gallery 中的键 -> 文件名
+GALLERY_FILES = {'scales': "scales.npy", 'mean': "pca_mean.npy", 'components': "pca_components.npy",
+                 'residuals': "pca_residuals.npy"}
+# 每行一个值的附带数组，删除样本时一起删除对应行
+GALLERY_ROW_ARRAYS = ("scales", "residuals")
+GALLERY_DTYPES = {'float32': np.float32, 'float16': np.float16, 'uint8': np.uint8, 'pca': np.float32}
+CURRENT_FILE = "CURRENT"
+GENERATION_PREFIX = "gen-"
+# 保留的旧版本数，正在内存映射旧版本的进程不受新版本发布影响
+KEEP_GENERATIONS = 2
+# 旧模型转换的锁文件；持有锁的进程异常退出时，超过 CONVERT_LOCK_STALE 秒的锁视为失效
+CONVERT_LOCK_FILE = ".convert.lock"
+CONVERT_LOCK_STALE = 120.0
+# 加载期间版本目录被清理（其间发布了新版本）时重新读取 CURRENT 的次数
+LOAD_ATTEMPTS = 3
+
+
+def _current_generation(model_dir):
+    """读取 CURRENT 指向的版本名，没有时返回 None"""
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _resolve_generation(model_dir):
+    """
+    只读一次 CURRENT，返回 (版本目录, 版本标识)；模型未发布时版本标识为 None
+    版本目录和版本标识必须来自同一次读取，分两次读取时中间可能切换到了新版本
+    """
+    generation = _current_generation(model_dir)
+    if generation:
+        return os.path.join(model_dir, generation), generation
+
+    # 早期的单目录格式以头文件修改时间作为版本
+    try:
+        return model_dir, f"legacy-{os.stat(os.path.join(model_dir, HEADER_FILE)).st_mtime_ns}"
+    except FileNotFoundError:
+        return model_dir, None
+
+
+def model_exists(model_dir=MODEL_DIR):
+    """二进制模型是否存在"""
+    return os.path.exists(os.path.join(_resolve_generation(model_dir)[0], HEADER_FILE))
+
+
+def model_version(model_dir=MODEL_DIR):
+    """
+    当前发布的模型版本标识，模型未发布时返回 None
+    只读一个很小的文件，可以频繁调用来检测是否有新模型
+    """
+    return _resolve_generation(model_dir)[1]
+
+
+def legacy_model_exists(model_path=LEGACY_MODEL_PATH, labels_path=LEGACY_LABELS_PATH):
+    """旧的 YAML + pickle 模型是否存在"""
+    return os.path.exists(model_path) and os.path.exists(labels_path)
+
+
+def _write_array(path, array):
+    with open(path, "wb") as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _next_generation(model_dir):
+    numbers = [int(name[len(GENERATION_PREFIX):]) for name in os.listdir(model_dir)
+               if name.startswith(GENERATION_PREFIX) and name[len(GENERATION_PREFIX):].isdigit()]
+    return f"{GENERATION_PREFIX}{max(numbers, default=0) + 1:06d}"
+
+
+def _cleanup_generations(model_dir, current):
+    """删除多余的旧版本和早期单目录格式的文件；被其他进程占用（Windows 下的内存映射）时跳过"""
+    generations = sorted(name for name in os.listdir(model_dir)
+                         if name.startswith(GENERATION_PREFIX) and name != current)
+    for name in generations[:max(0, len(generations) - (KEEP_GENERATIONS - 1))]:
+        shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+
+    for name in (HEADER_FILE, HISTOGRAMS_FILE, LABELS_FILE, SUMS_FILE) + tuple(GALLERY_FILES.values()):
+        try:
+            os.remove(os.path.join(model_dir, name))
+        except OSError:
+            pass
+
+
+def _row_sums(histograms, gallery):
+    """匹配时使用的每行之和（uint8 按反量化后的值，pca 为平方范数）"""
+    if gallery['encoding'] == "pca":
+        return np.einsum("ij,ij->i", histograms, histograms, dtype=np.float64)
+    sums = histograms.sum(axis=1, dtype=np.float64)
+    if gallery['encoding'] == "uint8":
+        sums = sums * gallery['scales']
+    return sums
+
+
+def save_model(histograms, labels, params, names, model_dir=MODEL_DIR, gallery=None):
+    """
+    发布二进制模型
+    params: radius / neighbors / grid_x / grid_y / mapping（见 matcher.FEATURE_PROFILES）
+    names: {标签ID: 用户名}
+    gallery: 图库编码描述（gallery_codec.encode 的返回值），为空时 histograms 为 float32 直方图
+    所有文件写入新的版本子目录，最后原子替换 CURRENT；读取方要么看到旧版本，要么看到完整的新版本。
+    返回新版本标识
+    """
+    gallery = gallery or {'encoding': "float32"}
+    if gallery['encoding'] not in GALLERY_DTYPES:
+        raise Exception(f"未知的图库编码: {gallery['encoding']}")
+    histograms = np.ascontiguousarray(histograms, dtype=GALLERY_DTYPES[gallery['encoding']])
+    labels = np.asarray(labels, dtype=np.int32).ravel()
+    if len(histograms) != len(labels):
+        raise Exception("直方图数量与标签数量不一致")
+
+    os.makedirs(model_dir, exist_ok=True)
+    # 创建版本子目录即占用该版本号，其他进程同时保存时换下一个
+    while True:
+        generation = _next_generation(model_dir)
+        generation_dir = os.path.join(model_dir, generation)
+        try:
+            os.makedirs(generation_dir)
+            break
+        except FileExistsError:
+            continue
+
+    _write_array(os.path.join(generation_dir, HISTOGRAMS_FILE), histograms)
+    _write_array(os.path.join(generation_dir, LABELS_FILE), labels)
+    _write_array(os.path.join(generation_dir, SUMS_FILE), _row_sums(histograms, gallery))
+    for key, file_name in GALLERY_FILES.items():
+        if key in gallery:
+            _write_array(os.path.join(generation_dir, file_name), np.asarray(gallery[key], dtype=np.float32))
+
+    header = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'generation': generation,
+        'created': time.time(),
+        'params': dict({key: int(params[key]) for key in ("radius", "neighbors", "grid_x", "grid_y")},
+                       mapping=params.get('mapping', "none")),
+        'count': int(histograms.shape[0]),
+        'dim': int(histograms.shape[1]) if histograms.ndim == 2 else 0,
+        'dtype': histograms.dtype.name,
+        'gallery': {key: value for key, value in gallery.items() if key not in GALLERY_FILES},
+        'names': {str(label): name for label, name in names.items()},
+    }
+
+    with open(os.path.join(generation_dir, HEADER_FILE), "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+
+    # 切换到新版本
+    current_path = os.path.join(model_dir, CURRENT_FILE)
+    with open(current_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_path + ".tmp", current_path)
+
+    _cleanup_generations(model_dir, generation)
+    return generation
+
+
+def load_model(model_dir=MODEL_DIR, mmap=True):
+    """
+    加载二进制模型
+    mmap=True 时直方图以只读内存映射方式打开，多个进程共享同一份页缓存
+    返回 dict: histograms / labels / sums / params / names / gallery / header / version
+    """
+    # 版本目录只解析一次，之后的文件都从这个目录打开；读取期间发布了新版本、
+    # 该目录被清理（FileNotFoundError）时重新读取 CURRENT，CURRENT 未变说明模型文件确实缺失
+    for _ in range(LOAD_ATTEMPTS):
+        generation_dir, version = _resolve_generation(model_dir)
+        if version is None:
+            break
+        try:
+            return _load_generation(generation_dir, version, mmap)
+        except FileNotFoundError:
+            if model_version(model_dir) == version:
+                break
+    raise Exception("模型未训练，请先训练模型")
+
+
+def _load_generation(generation_dir, version, mmap):
+    # 先列出目录：附带数组按列表判断是否存在，目录在读取中途被删除时抛出 FileNotFoundError，
+    # 而不是把缺失的文件当成该编码没有附带数组
+    files = set(os.listdir(generation_dir))
+    with open(os.path.join(generation_dir, HEADER_FILE), "r", encoding="utf-8") as f:
+        header = json.load(f)
+
+    if header.get('format') != FORMAT_NAME:
+        raise Exception("不是有效的模型文件")
+    if header.get('version', 0) > FORMAT_VERSION:
+        raise Exception(f"模型格式版本过新: {header.get('version')}")
+
+    mmap_mode = "r" if mmap else None
+    histograms = np.load(os.path.join(generation_dir, HISTOGRAMS_FILE), mmap_mode=mmap_mode)
+    labels = np.load(os.path.join(generation_dir, LABELS_FILE))
+    sums = np.load(os.path.join(generation_dir, SUMS_FILE))
+
+    if histograms.shape != (header['count'], header['dim']) or len(labels) != header['count']:
+        raise Exception("模型文件不完整或已损坏")
+
+    gallery = dict(header.get('gallery') or {'encoding': "float32"})
+    for key, file_name in GALLERY_FILES.items():
+        if file_name in files:
+            gallery[key] = np.load(os.path.join(generation_dir, file_name))
+
+    return {
+        'histograms': histograms,
+        'labels': labels,
+        'sums': sums,
+        'params': dict({'mapping': "none"}, **header['params']),
+        'names': {int(label): name for label, name in header['names'].items()},
+        'gallery': gallery,
+        'header': header,
+        'version': version,
+    }
+
+
+def read_legacy_model(model_path=LEGACY_MODEL_PATH, labels_path=LEGACY_LABELS_PATH):
+    """读取旧的 lbph_model.yml + labels.pkl，返回 (直方图矩阵, 标签数组, 参数, 用户名字典)"""
+    import cv2
+
+    if not legacy_model_exists(model_path, labels_path):
+        raise Exception("旧模型文件不存在")
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+
+    params = {
+        'radius': recognizer.getRadius(),
+        'neighbors': recognizer.getNeighbors(),
+        'grid_x': recognizer.getGridX(),
+        'grid_y': recognizer.getGridY(),
+    }
+    histograms = recognizer.getHistograms()
+    if len(histograms) > 0:
+        histograms = np.vstack([h.reshape(1, -1) for h in histograms])
+    else:
+        histograms = np.empty((0, params['grid_x'] * params['grid_y'] * 2 ** params['neighbors']),
+                              dtype=np.float32)
+
+    with open(labels_path, "rb") as f:
+        names = pickle.load(f)
+
+    return histograms, recognizer.getLabels().ravel().astype(np.int32), params, names
+
+
+def convert_legacy_model(model_path=LEGACY_MODEL_PATH, labels_path=LEGACY_LABELS_PATH, model_dir=MODEL_DIR,
+                         force=False, timeout=60.0):
+    """
+    把旧的 YAML/pickle 模型转换为二进制模型，返回样本数
+    多个进程（批量识别的工作进程、多个服务实例）同时调用时只有拿到锁文件的进程转换，
+    其他进程等待其完成后直接使用转换结果；force=True 时即使已有二进制模型也重新转换
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    lock_path = os.path.join(model_dir, CONVERT_LOCK_FILE)
+    deadline = time.time() + timeout
+    while True:
+        if not force and model_exists(model_dir):
+            return int(load_model(model_dir)['header']['count'])
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock_path).st_mtime > CONVERT_LOCK_STALE:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise Exception("等待其他进程转换旧模型超时")
+            time.sleep(0.05)
+
+    try:
+        os.close(fd)
+        # 等锁期间其他进程可能已经转换完成
+        if not force and model_exists(model_dir):
+            return int(load_model(model_dir)['header']['count'])
+        histograms, labels, params, names = read_legacy_model(model_path, labels_path)
+        save_model(histograms, labels, params, names, model_dir)
+        return len(labels)
+    finally:
+        os.remove(lock_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="将 lbph_model.yml + labels.pkl 转换为二进制模型")
+    parser.add_argument("--yml", default=LEGACY_MODEL_PATH, help="旧模型文件")
+    parser.add_argument("--labels", default=LEGACY_LABELS_PATH, help="旧标签文件")
+    parser.add_argument("--out", default=MODEL_DIR, help="输出模型目录")
+    args = parser.parse_args()
+
+    count = convert_legacy_model(args.yml, args.labels, args.out, force=True)
+    print(f"转换完成: {count} 个样本 -> {args.out}")
\ No newline at end of file
@@ -0,0 +1,256 @@
+import argparse
+import os
+import threading
+import time
+from collections import deque
+
+from video_source import is_file_source, open_capture, parse_source
+
+# 网络流连续 RECONNECT_FAILURES 次读取失败时，等待 RECONNECT_DELAY 秒后重新连接
+RECONNECT_FAILURES = 50
+RECONNECT_DELAY = 1.0
+
+
+class CameraSource:
+    """
+    一路视频源：读取线程把帧放入有界队列，队列满时丢弃最旧的帧
+    每路有自己的识别器（与其他路共享模型），同一时间最多一个工作线程处理它
+    """
+
+    def __init__(self, source_id, source, recognizer, queue_size):
+        self.source_id = source_id
+        self.source = parse_source(source)
+        self.recognizer = recognizer
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.cap = None
+        self.busy = False
+        self.finished = False
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.faces = 0
+        self.avg_latency_ms = 0.0
+        self.reconnects = 0
+        self.started_at = 0.0
+        self._thread = None
+
+
+class MultiCameraScheduler:
+    """
+    多路视频源共享一组识别工作线程
+    模型只加载一次；工作线程按轮询顺序从有待处理帧的视频源中取帧，繁忙的视频源不会饿死其他源。
+    OpenCV 检测与 NumPy 匹配会释放 GIL，因此使用线程池并共享同一份内存映射的图库。
+    每处理完一帧调用 on_result(source_id, frame, results, latency_ms)
+    """
+
+    def __init__(self, recognizer, sources, on_result=None, workers=None, queue_size=2):
+        if not sources:
+            raise Exception("请至少指定一个视频源")
+        if recognizer.matcher is None:
+            recognizer.load_model()
+
+        self.recognizer = recognizer
+        self.on_result = on_result
+        self.workers = workers or os.cpu_count() or 1
+        self.sources = [CameraSource(i, source, recognizer.fork(), queue_size)
+                        for i, source in enumerate(sources)]
+        self._cursor = 0
+        self._running = False
+        self._threads = []
+        self._condition = threading.Condition()
+
+    def start(self):
+        # 某一路打不开时释放已经打开的视频源再报错
+        try:
+            for camera in self.sources:
+                camera.cap = open_capture(camera.source)
+        except Exception:
+            for camera in self.sources:
+                if camera.cap is not None:
+                    camera.cap.release()
+                camera.cap = None
+            raise
+
+        self._running = True
+        for camera in self.sources:
+            camera.started_at = time.perf_counter()
+            camera._thread = threading.Thread(target=self._read_loop, args=(camera,),
+                                              name=f"camera-reader-{camera.source_id}", daemon=True)
+            camera._thread.start()
+
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work_loop, name=f"recognition-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        for camera in self.sources:
+            if camera._thread is not None:
+                camera._thread.join(timeout=2)
+            camera._thread = None
+            if camera.cap is not None:
+                camera.cap.release()
+            camera.cap = None
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def is_running(self):
+        with self._condition:
+            return self._running and not all(
+                camera.finished and not camera.queue and not camera.busy for camera in self.sources)
+
+    def _read_loop(self, camera):
+        is_file = is_file_source(camera.source)
+        is_stream = not is_file and not isinstance(camera.source, int)
+        failures = 0
+        while self._running:
+            start = time.perf_counter()
+            ret, frame = camera.cap.read()
+            if not ret:
+                # 视频文件读完即结束，摄像头偶发失败则重试，网络流持续失败时重新连接
+                if is_file:
+                    break
+                failures += 1
+                if is_stream and failures >= RECONNECT_FAILURES:
+                    self._reconnect(camera)
+                    failures = 0
+                else:
+                    time.sleep(0.005)
+                continue
+            failures = 0
+            metrics = camera.recognizer.metrics
+            metrics.observe("read", (time.perf_counter() - start) * 1000)
+
+            with self._condition:
+                if len(camera.queue) >= camera.queue_size:
+                    camera.queue.popleft()
+                    camera.frames_dropped += 1
+                    metrics.increment("frames_dropped")
+                camera.queue.append((frame, time.perf_counter()))
+                camera.frames_read += 1
+                self._condition.notify()
+
+        with self._condition:
+            camera.finished = True
+            self._condition.notify_all()
+
+    def _reconnect(self, camera):
+        """重新打开断开的网络流；失败时保留已关闭的连接，之后的读取继续失败并再次重试"""
+        camera.cap.release()
+        time.sleep(RECONNECT_DELAY)
+        try:
+            cap = open_capture(camera.source)
+        except Exception as e:
+            print(f"视频源 {camera.source_id} 重新连接失败: {e}")
+            return
+        with self._condition:
+            if not self._running:
+                cap.release()
+                return
+            camera.cap = cap
+            camera.reconnects += 1
+
+    def _next_camera(self):
+        """从游标位置开始轮询，找到有待处理帧且未被占用的视频源"""
+        count = len(self.sources)
+        for step in range(count):
+            camera = self.sources[(self._cursor + step) % count]
+            if camera.queue and not camera.busy:
+                self._cursor = (camera.source_id + 1) % count
+                return camera
+        return None
+
+    def _work_loop(self):
+        while self._running:
+            with self._condition:
+                camera = self._next_camera()
+                while camera is None and self._running:
+                    self._condition.wait(0.5)
+                    camera = self._next_camera()
+                if camera is None:
+                    return
+                frame, captured_at = camera.queue.popleft()
+                camera.busy = True
+
+            try:
+                frame, results = camera.recognizer.process_frame(frame)
+            except Exception as e:
+                print(f"视频源 {camera.source_id} 识别错误: {e}")
+                results = None
+
+            latency_ms = (time.perf_counter() - captured_at) * 1000
+            with self._condition:
+                camera.busy = False
+                if results is not None:
+                    camera.frames_processed += 1
+                    camera.faces += len(results)
+                    camera.avg_latency_ms = latency_ms if camera.frames_processed == 1 else \
+                        0.9 * camera.avg_latency_ms + 0.1 * latency_ms
+                # 该视频源可能还有积压的帧
+                self._condition.notify()
+
+            if results is not None and self.on_result is not None and self._running:
+                self.on_result(camera.source_id, frame, results, latency_ms)
+
+    def set_threshold(self, threshold):
+        self.recognizer.set_threshold(threshold)
+        for camera in self.sources:
+            camera.recognizer.set_threshold(threshold)
+
+    def stats(self):
+        """每路视频源的帧率、队列深度、丢帧数与平均延迟"""
+        now = time.perf_counter()
+        with self._condition:
+            stats = []
+            for camera in self.sources:
+                elapsed = now - camera.started_at if camera.started_at else 0.0
+                stats.append({
+                    'source': camera.source,
+                    'frames_read': camera.frames_read,
+                    'frames_processed': camera.frames_processed,
+                    'frames_dropped': camera.frames_dropped,
+                    'queue_depth': len(camera.queue),
+                    'faces': camera.faces,
+                    'fps': camera.frames_processed / elapsed if elapsed > 0 else 0.0,
+                    'avg_latency_ms': camera.avg_latency_ms,
+                    'reconnects': camera.reconnects,
+                    'finished': camera.finished,
+                })
+            return stats
+
+
+if __name__ == "__main__":
+    from recognize import FaceRecognizer
+
+    parser = argparse.ArgumentParser(description="多路摄像头/视频同时识别，定时打印每路的统计")
+    parser.add_argument("sources", nargs="+", help="摄像头编号、视频文件或流地址")
+    parser.add_argument("--workers", type=int, default=None, help="识别线程数（默认CPU核数）")
+    parser.add_argument("--queue-size", type=int, default=2, help="每路最多积压的帧数")
+    parser.add_argument("--threshold", type=float, default=50, help="识别阈值")
+    parser.add_argument("--report", type=float, default=5.0, help="统计打印间隔（秒）")
+    parser.add_argument("--metrics-port", type=int, default=None, help="在本地该端口提供 Prometheus /metrics")
+    args = parser.parse_args()
+
+    recognizer = FaceRecognizer()
+    recognizer.set_threshold(args.threshold)
+    scheduler = MultiCameraScheduler(recognizer, args.sources, workers=args.workers, queue_size=args.queue_size)
+    if args.metrics_port:
+        recognizer.metrics.serve(args.metrics_port)
+    scheduler.start()
+    try:
+        while scheduler.is_running():
+            time.sleep(args.report)
+            for item in scheduler.stats():
+                print(f"[{item['source']}] {item['fps']:.1f} 帧/秒, 队列 {item['queue_depth']}, "
+                      f"丢帧 {item['frames_dropped']}, 人脸 {item['faces']}, "
+                      f"平均延迟 {item['avg_latency_ms']:.0f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
\ No newline at end of file
@@ -0,0 +1,179 @@
+import threading
+import time
+
+# cv2.CAP_PROP_FPS，本模块不导入 cv2
+CAP_PROP_FPS = 5
+
+
+class LatestFrameReader:
+    """
+    摄像头读取线程
+    只保留最新的一帧；识别线程还没取走就被新帧覆盖的旧帧计为丢弃
+    传入 metrics 时记录 cap.read 耗时与丢帧数；
+    is_file=True 时按视频帧率 fps 读取（与播放速度一致），读到文件末尾后停止并置 ended
+    """
+
+    def __init__(self, cap, metrics=None, is_file=False, fps=0.0):
+        self.cap = cap
+        self.metrics = metrics
+        self.is_file = is_file
+        self.fps = fps
+        self.ended = False
+        self.frame = None
+        self.frame_id = 0
+        self.timestamp = 0.0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._consumed_id = 0
+        self._running = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="camera-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _wait_until(self, due):
+        """等到视频中下一帧的播放时间，期间可以被 stop 打断"""
+        with self._condition:
+            while self._running:
+                remaining = due - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+    def _run(self):
+        started = time.perf_counter()
+        while self._running:
+            if self.is_file and self.fps > 0:
+                self._wait_until(started + self.frames_read / self.fps)
+                if not self._running:
+                    break
+
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                if self.is_file:
+                    # 视频文件读完，通知等待中的识别线程
+                    with self._condition:
+                        self.ended = True
+                        self._running = False
+                        self._condition.notify_all()
+                    break
+                time.sleep(0.005)
+                continue
+            if self.metrics is not None:
+                self.metrics.observe("read", (time.perf_counter() - start) * 1000)
+
+            with self._condition:
+                if self.frame_id > self._consumed_id:
+                    self.frames_dropped += 1
+                    if self.metrics is not None:
+                        self.metrics.increment("frames_dropped")
+                self.frame = frame
+                self.frame_id += 1
+                self.timestamp = time.perf_counter()
+                self.frames_read += 1
+                self._condition.notify_all()
+
+    def read(self, timeout=1.0):
+        """等待比上次取走的更新的帧，返回 (frame, 采集时间) 或 (None, None)"""
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: self.frame_id > self._consumed_id or not self._running, timeout):
+                return None, None
+            if self.frame_id <= self._consumed_id:
+                return None, None
+
+            self._consumed_id = self.frame_id
+            return self.frame, self.timestamp
+
+    def finished(self):
+        """视频文件已读完且最后一帧已被取走"""
+        with self._condition:
+            return self.ended and self.frame_id <= self._consumed_id
+
+
+class RecognitionPipeline:
+    """
+    实时识别流水线：读取线程 + 识别线程
+    每处理完一帧调用 on_result(frame, results, latency_ms)，latency_ms 为从采集到识别完成的端到端延迟；
+    source 为视频文件时按文件帧率播放，处理完最后一帧后流水线停止并调用 on_end()；
+    在 GUI 中 on_result / on_end 应为信号的 emit，由 Qt 投递到主线程
+    """
+
+    def __init__(self, recognizer, cap, on_result, on_end=None, source=None):
+        from video_source import is_file_source
+
+        is_file = source is not None and is_file_source(source)
+        fps = cap.get(CAP_PROP_FPS) if is_file else 0.0
+        self.recognizer = recognizer
+        self.reader = LatestFrameReader(cap, getattr(recognizer, "metrics", None), is_file, fps or 0.0)
+        self.on_result = on_result
+        self.on_end = on_end
+        self.frames_processed = 0
+        self.last_latency_ms = 0.0
+        self.avg_latency_ms = 0.0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self.reader.start()
+        self._thread = threading.Thread(target=self._run, name="recognition-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self.reader.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def is_running(self):
+        return self._running
+
+    def _run(self):
+        while self._running:
+            frame, captured_at = self.reader.read(timeout=0.5)
+            if frame is None:
+                if self.reader.finished():
+                    self._running = False
+                    if self.on_end is not None:
+                        self.on_end()
+                continue
+
+            try:
+                frame, results = self.recognizer.process_frame(frame)
+            except Exception as e:
+                print(f"识别线程错误: {e}")
+                continue
+
+            latency_ms = (time.perf_counter() - captured_at) * 1000
+            self.frames_processed += 1
+            self.last_latency_ms = latency_ms
+            # 指数滑动平均，便于界面显示
+            self.avg_latency_ms = latency_ms if self.frames_processed == 1 else \
+                0.9 * self.avg_latency_ms + 0.1 * latency_ms
+
+            if self._running:
+                self.on_result(frame, results, latency_ms)
+
+    def stats(self):
+        return {
+            'frames_read': self.reader.frames_read,
+            'frames_processed': self.frames_processed,
+            'frames_dropped': self.reader.frames_dropped,
+            'ended': self.reader.ended,
+            'last_latency_ms': self.last_latency_ms,
+            'avg_latency_ms': self.avg_latency_ms,
+        }
\ No newline at end of file
@@ -1,46 +1,311 @@
 import cv2
 import os
+import json
+import time
+import hashlib
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
+import registry
 
-def preprocess(user_name, input_dir="data/raw", output_dir="data/processed"):
+# 预处理参数变化时清单失效，全部重新处理
+PREPROCESS_PARAMS = {'scale_factor': 1.1, 'min_neighbors': 4, 'size': 200}
+MANIFEST_NAME = ".manifest.json"
+# 版本 2 起检测出的人脸使用独立的文件名空间（见 _face_output_name）
+MANIFEST_VERSION = 2
+
+# 每个工作进程只加载一次的人脸检测器
+_worker_cascade = None
+
+
+def _face_output_name(img_name, index):
     """
-    预处理人脸图像
+    检测出的人脸的文件名：{原文件名}.face{序号}{扩展名}，如 3.jpg.face0.jpg
+    不同原图、不同序号得到的文件名互不相同，也不会与采集时直接保存的样本（沿用原文件名）重名
+    """
+    return f"{img_name}.face{index}{os.path.splitext(img_name)[1]}"
+
+
+def normalize_face(face_img):
+    """把裁剪好的人脸缩放到 200x200 并做直方图均衡化（预处理与采集共用）"""
+    size = PREPROCESS_PARAMS['size']
+    return cv2.equalizeHist(cv2.resize(face_img, (size, size)))
+
+
+def _process_image(face_cascade, img_path, output_user_dir):
+    """检测、裁剪、归一化并均衡化一张原始图像，返回保存的人脸文件名列表"""
+    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+
+    if img is None:
+        return []
+
+    # 检测人脸
+    faces = face_cascade.detectMultiScale(
+        img, PREPROCESS_PARAMS['scale_factor'], PREPROCESS_PARAMS['min_neighbors'])
+
+    img_name = os.path.basename(img_path)
+    outputs = []
+    for i, (x, y, w, h) in enumerate(faces):
+        # 裁剪、调整大小并均衡化
+        face = normalize_face(img[y:y + h, x:x + w])
+
+        # 保存处理后的图像
+        output_name = _face_output_name(img_name, i)
+        cv2.imwrite(os.path.join(output_user_dir, output_name), face)
+        outputs.append(output_name)
+
+    return outputs
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _load_manifest(output_user_dir, keep=()):
+    """
+    读取清单；版本或预处理参数变化时重建清单，并删除旧清单记录的输出，避免旧参数的人脸继续参与训练
+    采集时已归一化、没有原图的样本无法重新生成，保留到新清单中。
+    没有清单或清单损坏时（如旧版本按原文件名保存的输出）目录内容来历不明，
+    删除除 keep（刚采集、即将登记的样本）之外的全部输出，由原图重新生成
+    """
+    manifest = {'version': MANIFEST_VERSION, 'params': PREPROCESS_PARAMS, 'entries': {}}
+    manifest_path = os.path.join(output_user_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        _remove_outputs(output_user_dir, [name for name in os.listdir(output_user_dir)
+                                          if not name.startswith(".") and name not in keep])
+        return manifest
+    if old.get('version') == MANIFEST_VERSION and old.get('params') == PREPROCESS_PARAMS:
+        return old
+
+    for img_name, entry in old.get('entries', {}).items():
+        if entry.get('captured') and 'size' not in entry:
+            manifest['entries'][img_name] = entry
+        else:
+            _remove_outputs(output_user_dir, entry.get('outputs', []))
+    return manifest
+
+
+def _save_manifest(output_user_dir, manifest):
+    manifest_path = os.path.join(output_user_dir, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def _plan_user(user_name, input_dir, output_dir):
+    """
+    对比清单与原始目录，找出需要重新处理的图像
+    大小和修改时间未变的直接跳过；变了但内容哈希相同的只更新清单；
+    采集时不保存原图（save_raw=False）的用户没有原始目录，只保留采集时登记的样本
+    返回 (清单, 待处理 [(图像名, 路径, 哈希)], 跳过数)
     """
     input_user_dir = os.path.join(input_dir, user_name)
     output_user_dir = os.path.join(output_dir, user_name)
+    has_raw = os.path.exists(input_user_dir)
+    if not has_raw and not os.path.exists(os.path.join(output_user_dir, MANIFEST_NAME)):
+        raise Exception(f"用户 {user_name} 的原始数据不存在")
     os.makedirs(output_user_dir, exist_ok=True)
 
-    if not os.path.exists(input_user_dir):
+    manifest = _load_manifest(output_user_dir)
+    if not has_raw and not _count_captured(manifest):
         raise Exception(f"用户 {user_name} 的原始数据不存在")
 
-    # 加载人脸检测器
-    face_cascade = cv2.CascadeClassifier(
-        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-    )
+    entries = manifest['entries']
+    pending = []
+    skipped = 0
+    seen = set()
 
-    processed_count = 0
-    for img_name in os.listdir(input_user_dir):
+    for img_name in (os.listdir(input_user_dir) if has_raw else []):
         img_path = os.path.join(input_user_dir, img_name)
-        img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+        if not os.path.isfile(img_path):
+            continue
+
+        seen.add(img_name)
+        stat = os.stat(img_path)
+        entry = entries.get(img_name)
+        outputs_exist = entry is not None and all(
+            os.path.exists(os.path.join(output_user_dir, name)) for name in entry['outputs'])
 
-        if img is None:
+        if outputs_exist and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            skipped += 1
             continue
 
-        # 检测人脸
-        faces = face_cascade.detectMultiScale(img, 1.1, 4)
+        digest = _file_hash(img_path)
+        if outputs_exist and entry.get('sha1') == digest:
+            entry['size'] = stat.st_size
+            entry['mtime_ns'] = stat.st_mtime_ns
+            skipped += 1
+            continue
+
+        pending.append((img_name, img_path, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': digest}))
+
+    # 原始图像已删除：清理其输出（采集时已归一化、未保存原图的样本除外）
+    for img_name in list(entries):
+        if img_name not in seen and not (entries[img_name].get('captured') and 'size' not in entries[img_name]):
+            _remove_outputs(output_user_dir, entries.pop(img_name)['outputs'])
+
+    return manifest, pending, skipped
+
+
+def _remove_outputs(output_user_dir, names):
+    for name in names:
+        path = os.path.join(output_user_dir, name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def _record_result(manifest, output_user_dir, img_name, source, outputs):
+    """记录一张图像的处理结果，并删除本次不再产生的旧输出"""
+    old = manifest['entries'].get(img_name)
+    if old is not None:
+        _remove_outputs(output_user_dir, [name for name in old['outputs'] if name not in outputs])
+    manifest['entries'][img_name] = dict(source, outputs=outputs)
+
+
+def _count_outputs(manifest):
+    return sum(len(entry['outputs']) for entry in manifest['entries'].values())
+
+
+def _count_captured(manifest):
+    return sum(1 for entry in manifest['entries'].values() if entry.get('captured'))
+
+
+def record_captured(user_name, names, input_dir="data/raw", output_dir="data/processed"):
+    """
+    登记采集时已经归一化保存到 output_dir 的人脸（文件名与原图相同）
+    有原图的按原图的大小/修改时间/哈希登记，之后预处理直接跳过，不再对已裁剪的人脸二次检测；
+    原图被修改时仍按普通原图重新处理
+    """
+    output_user_dir = os.path.join(output_dir, user_name)
+    os.makedirs(output_user_dir, exist_ok=True)
+    manifest = _load_manifest(output_user_dir, keep=names)
+
+    for img_name in names:
+        entry = {'captured': True, 'outputs': [img_name]}
+        img_path = os.path.join(input_dir, user_name, img_name)
+        if os.path.isfile(img_path):
+            stat = os.stat(img_path)
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha1=_file_hash(img_path))
+        manifest['entries'][img_name] = entry
+
+    _save_manifest(output_user_dir, manifest)
+
+
+def preprocess(user_name, input_dir="data/raw", output_dir="data/processed"):
+    """
+    预处理人脸图像
+    只处理新增或内容变化的原始图像，返回本次新保存的人脸数（跳过的图像不计入，
+    该用户当前的样本总数见 preprocess_batch 统计中的 users）
+    """
+    manifest, pending, _ = _plan_user(user_name, input_dir, output_dir)
+    output_user_dir = os.path.join(output_dir, user_name)
+
+    processed_count = 0
+    if pending:
+        # 加载人脸检测器
+        face_cascade = registry.get_cascade()
+
+        for img_name, img_path, source in pending:
+            outputs = _process_image(face_cascade, img_path, output_user_dir)
+            _record_result(manifest, output_user_dir, img_name, source, outputs)
+            processed_count += len(outputs)
+
+    _save_manifest(output_user_dir, manifest)
+    return processed_count
+
+
+def _init_worker():
+    """工作进程初始化：加载一次检测器，并让 OpenCV 单线程运行以免与进程池争抢CPU"""
+    global _worker_cascade
+    cv2.setNumThreads(1)
+    _worker_cascade = registry.get_cascade()
+
+
+def _process_task(task):
+    user_name, img_name, img_path, output_user_dir = task
+    return user_name, img_name, _process_image(_worker_cascade, img_path, output_user_dir)
+
+
+def _list_users(input_dir, output_dir):
+    """有原始目录的用户，加上没有原图、只有采集时登记样本的用户"""
+    if not os.path.exists(input_dir) and not os.path.exists(output_dir):
+        raise Exception("原始数据目录不存在")
+
+    users = set()
+    if os.path.exists(input_dir):
+        users.update(name for name in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, name)))
+    if os.path.exists(output_dir):
+        for name in os.listdir(output_dir):
+            manifest_path = os.path.join(output_dir, name, MANIFEST_NAME)
+            if name in users or not os.path.exists(manifest_path):
+                continue
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f).get('entries', {})
+            except (OSError, ValueError):
+                continue
+            if any(entry.get('captured') for entry in entries.values()):
+                users.add(name)
+    return sorted(users)
+
+
+def preprocess_batch(users=None, input_dir="data/raw", output_dir="data/processed", workers=None):
+    """
+    多进程批量预处理
+    users 为空时处理 input_dir 下的所有用户；需要处理的图像按张分配给进程池，
+    返回每个用户的人脸数、二次检测未检出人脸的图像数（no_face）、
+    采集时已归一化而免于二次检测的样本数（captured）以及总吞吐量
+    """
+    if users is None:
+        users = _list_users(input_dir, output_dir)
+
+    start = time.perf_counter()
+    manifests = {}
+    sources = {}
+    tasks = []
+    skipped = 0
+    for user_name in users:
+        manifest, pending, user_skipped = _plan_user(user_name, input_dir, output_dir)
+        manifests[user_name] = manifest
+        skipped += user_skipped
+
+        output_user_dir = os.path.join(output_dir, user_name)
+        for img_name, img_path, source in pending:
+            sources[(user_name, img_name)] = source
+            tasks.append((user_name, img_name, img_path, output_user_dir))
 
-        for (x, y, w, h) in faces:
-            # 裁剪和调整大小
-            face = img[y:y + h, x:x + w]
-            face = cv2.resize(face, (200, 200))
+    workers = workers or os.cpu_count() or 1
 
-            # 直方图均衡化
-            face = cv2.equalizeHist(face)
+    no_face = 0
+    if tasks:
+        chunksize = max(1, min(32, len(tasks) // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for user_name, img_name, outputs in pool.map(_process_task, tasks, chunksize=chunksize):
+                no_face += not outputs
+                _record_result(manifests[user_name], os.path.join(output_dir, user_name),
+                               img_name, sources[(user_name, img_name)], outputs)
 
-            # 保存处理后的图像
-            output_path = os.path.join(output_user_dir, img_name)
-            cv2.imwrite(output_path, face)
-            processed_count += 1
+    counts = {}
+    captured = 0
+    for user_name, manifest in manifests.items():
+        _save_manifest(os.path.join(output_dir, user_name), manifest)
+        counts[user_name] = _count_outputs(manifest)
+        captured += _count_captured(manifest)
 
-    return processed_count
\ No newline at end of file
+    elapsed = time.perf_counter() - start
+    return {
+        'users': counts,
+        'images': len(tasks) + skipped,
+        'processed': len(tasks),
+        'skipped': skipped,
+        'no_face': no_face,
+        'captured': captured,
+        'faces': sum(counts.values()),
+        'workers': workers,
+        'seconds': elapsed,
+        'images_per_sec': len(tasks) / elapsed if elapsed > 0 else 0.0,
+    }
\ No newline at end of file
@@ -0,0 +1,152 @@
+import argparse
+import time
+
+import numpy as np
+
+from matcher import DEFAULT_PROFILE, LBPHMatcher, chi_square_distances, feature_params
+
+# 原型选择方法：
+#   kmedoids  按卡方距离做 k-medoids 聚类，每个簇保留中心样本（真实样本，可直接放入图库）
+#   coverage  最远点贪心（k-center），依次加入离已选样本最远的样本，保证每个样本离某个原型都不太远
+METHODS = ("kmedoids", "coverage")
+MAX_ITERATIONS = 20
+
+
+def select_prototypes(histograms, k, method="kmedoids", seed=0):
+    """
+    从一个用户的直方图中选出 k 个代表样本，返回行号数组（升序）
+    样本数不超过 k 时全部保留
+    """
+    if method not in METHODS:
+        raise Exception(f"未知的原型选择方法: {method}")
+
+    histograms = np.asarray(histograms, dtype=np.float32)
+    n = len(histograms)
+    if k <= 0:
+        raise Exception("原型数必须大于0")
+    if n <= k:
+        return np.arange(n)
+
+    dist = chi_square_distances(histograms, histograms)
+    chosen = _farthest_points(dist, k)
+    if method == "kmedoids":
+        chosen = _kmedoids(dist, chosen, np.random.default_rng(seed))
+    return np.sort(chosen)
+
+
+def _farthest_points(dist, k):
+    """从离所有样本最近的中心样本开始，每次加入离已选集合最远的样本"""
+    chosen = [int(np.argmin(dist.sum(axis=1)))]
+    nearest = dist[chosen[0]].copy()
+    while len(chosen) < k:
+        candidate = int(np.argmax(nearest))
+        chosen.append(candidate)
+        nearest = np.minimum(nearest, dist[candidate])
+    return np.array(chosen)
+
+
+def _kmedoids(dist, medoids, rng):
+    """交替分配与更新中心样本，直到不再变化"""
+    medoids = medoids.copy()
+    for _ in range(MAX_ITERATIONS):
+        assignment = np.argmin(dist[:, medoids], axis=1)
+        updated = medoids.copy()
+        for cluster in range(len(medoids)):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members) == 0:
+                # 空簇：换成离当前中心最远的样本
+                updated[cluster] = int(np.argmax(dist[:, medoids].min(axis=1)))
+                continue
+            within = dist[np.ix_(members, members)].sum(axis=1)
+            updated[cluster] = members[np.argmin(within)]
+        if np.array_equal(np.sort(updated), np.sort(medoids)):
+            break
+        medoids = updated
+    # 重复的中心（极少见）用随机未选样本补齐
+    unique = np.unique(medoids)
+    if len(unique) < len(medoids):
+        rest = np.setdiff1d(np.arange(len(dist)), unique)
+        unique = np.concatenate([unique, rng.choice(rest, len(medoids) - len(unique), replace=False)])
+    return unique
+
+
+def reduce_gallery(histograms, labels, k, method="kmedoids", seed=0):
+    """对每个标签分别选出 k 个原型，返回 (直方图, 标签)"""
+    labels = np.asarray(labels)
+    keep = []
+    for label in np.unique(labels):
+        rows = np.flatnonzero(labels == label)
+        keep.append(rows[select_prototypes(histograms[rows], k, method, seed)])
+    keep = np.sort(np.concatenate(keep)) if keep else np.empty(0, dtype=np.int64)
+    return np.asarray(histograms)[keep], labels[keep]
+
+
+def holdout_report(histograms, labels, k, method="kmedoids", params=None, holdout=0.3, repeat=3, seed=0):
+    """
+    留出评估：每个用户随机留出 holdout 比例的样本作为探针，
+    比较全部样本与 k 个原型作为图库时的识别率与每张人脸的匹配耗时
+    """
+    params = params or feature_params(DEFAULT_PROFILE)
+    histograms = np.asarray(histograms, dtype=np.float32)
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+
+    train_rows, probe_rows = [], []
+    for label in np.unique(labels):
+        rows = rng.permutation(np.flatnonzero(labels == label))
+        split = int(round(len(rows) * holdout)) if len(rows) > 1 else 0
+        probe_rows.append(rows[:split])
+        train_rows.append(rows[split:])
+    train_rows = np.sort(np.concatenate(train_rows))
+    probe_rows = np.sort(np.concatenate(probe_rows))
+    if len(probe_rows) == 0:
+        raise Exception("样本太少，无法留出评估")
+
+    probes, truth = histograms[probe_rows], labels[probe_rows]
+    full = (histograms[train_rows], labels[train_rows])
+    reduced = reduce_gallery(full[0], full[1], k, method, seed)
+
+    report = {'users': len(np.unique(labels)), 'samples': len(full[1]), 'prototypes': len(reduced[1]),
+              'probes': len(probe_rows), 'k': k, 'method': method}
+    for name, (gallery, gallery_labels) in (("full", full), ("reduced", reduced)):
+        matcher = LBPHMatcher(gallery, gallery_labels, **params)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            matches = matcher.match_histograms(probes)
+            timings.append(time.perf_counter() - start)
+        predicted = np.array([label for label, _ in matches])
+        report[name] = {'accuracy': float((predicted == truth).mean()),
+                        'ms_per_face': min(timings) * 1000 / len(probes)}
+    return report
+
+
+if __name__ == "__main__":
+    from train import extract_features, iter_users
+
+    parser = argparse.ArgumentParser(description="原型选择的留出评估：对比全部样本与每人 k 个原型的识别率和耗时")
+    parser.add_argument("--data", default="data/processed", help="预处理数据目录")
+    parser.add_argument("--store", help="打包样本库目录（指定时代替 --data）")
+    parser.add_argument("-k", "--prototypes", type=int, default=10, help="每个用户保留的原型数")
+    parser.add_argument("--method", choices=METHODS, default="kmedoids", help="原型选择方法")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help="特征配置")
+    parser.add_argument("--holdout", type=float, default=0.3, help="每个用户留出作探针的样本比例")
+    args = parser.parse_args()
+
+    params = feature_params(args.profile)
+    histograms, labels = [], []
+    for label, (user_name, _, source) in enumerate(iter_users(args.data, args.store)):
+        user_histograms = extract_features(source, params)
+        if user_histograms is not None:
+            histograms.append(user_histograms)
+            labels.append(np.full(len(user_histograms), label, dtype=np.int32))
+    if not histograms:
+        raise Exception("没有找到训练数据")
+
+    report = holdout_report(np.vstack(histograms), np.concatenate(labels), args.prototypes, args.method,
+                            params, args.holdout)
+    print(f"用户 {report['users']}, 训练样本 {report['samples']}, 原型 {report['prototypes']}, "
+          f"留出探针 {report['probes']} ({report['method']}, k={report['k']})")
+    for name, title in (("full", "全部样本"), ("reduced", "原型")):
+        item = report[name]
+        print(f"{title:<6} 识别率 {item['accuracy']:.3f}  匹配 {item['ms_per_face']:.3f} ms/人脸")
\ No newline at end of file
@@ -1,65 +1,259 @@
+import threading
+import time
+
 import cv2
-import pickle
-import os
 import numpy as np
 
+import model_store
+import registry
+from gallery_index import GalleryIndex
+from matcher import LBPHMatcher
+from metrics import Metrics
+from result_cache import CACHE_SIZE, CACHE_TTL, HASH_SIZE, ResultCache
+from tracker import FaceTracker, box_iou
+from video_source import VideoSource, open_capture
+
+
+class LoadedModel:
+    """一版已加载的模型：匹配器、可选的图库索引、用户名和版本标识，创建后不再修改"""
+
+    def __init__(self, matcher, names, version, index=None):
+        self.matcher = matcher
+        self.names = names
+        self.version = version
+        self.index = index
+
+
+class ModelSlot:
+    """
+    当前模型的共享引用，同一模型目录的识别器共用同一个（见 registry.get_model_slot）
+    换模型只是一次属性赋值，读取方每次取一次 current，拿到的总是完整的一版模型
+    """
 
-class FaceRecognizer:
     def __init__(self):
-        self.cap = None
-        self.recognizer = None
-        self.names = {}
-        self.threshold = 50
-        self.detector = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        )
+        self.current = None
+        self.reloads = 0
+        self.lock = threading.Lock()
 
-        # 初始化识别器
-        self.setup_recognizer()
 
-    def setup_recognizer(self):
-        """设置LBPH识别器参数"""
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create(
-            radius=2,
-            neighbors=16,
-            grid_x=8,
-            grid_y=8,
-        )
+class FaceRecognizer:
+    def __init__(self, model_path=model_store.MODEL_DIR):
+        self.cap = None
+        self.model_path = model_path
+        self.slot = registry.get_model_slot(model_path)
+        self.use_index = False
+        self.num_candidates = 5
+        self.tracker = None
+        self._identity_version = None
+        self.detection_scale = 1.0
+        self.roi_mode = False
+        self.full_sweep_interval = 15
+        self._last_faces = []
+        self._frames_since_sweep = 0
+        self.threshold = 50
+        self.stream_stats = None
+        self.metrics = Metrics()
+        self.result_cache = None
+        self._reload_stop = None
+        self._detector = None
+
+    @property
+    def detector(self):
+        """人脸检测器，来自进程级注册表（每个线程只加载一次）"""
+        if self._detector is not None:
+            return self._detector
+        return registry.get_cascade()
+
+    @detector.setter
+    def detector(self, detector):
+        self._detector = detector
+
+    @property
+    def matcher(self):
+        model = self.slot.current
+        return model.matcher if model is not None else None
+
+    @property
+    def index(self):
+        model = self.slot.current
+        return model.index if model is not None else None
+
+    @property
+    def names(self):
+        model = self.slot.current
+        return model.names if model is not None else {}
+
+    @property
+    def model_version(self):
+        model = self.slot.current
+        return model.version if model is not None else None
 
     def is_model_trained(self):
         """检查模型是否已训练"""
-        return os.path.exists("lbph_model.yml") and os.path.exists("labels.pkl")
+        return model_store.model_exists(self.model_path) or model_store.legacy_model_exists()
 
     def load_model(self):
-        """加载训练好的模型"""
+        """
+        加载训练好的模型（直方图以内存映射方式打开）
+        同一模型目录在进程内只加载一次；已加载且没有发布新版本时直接复用
+        """
         if not self.is_model_trained():
             raise Exception("模型未训练，请先训练模型")
 
-        self.recognizer.read("lbph_model.yml")
-
-        if os.path.exists("labels.pkl"):
-            with open("labels.pkl", "rb") as f:
-                self.names = pickle.load(f)
+        # 旧的 lbph_model.yml + labels.pkl 自动转换一次
+        if not model_store.model_exists(self.model_path):
+            model_store.convert_legacy_model(model_dir=self.model_path)
+
+        with self.slot.lock:
+            current = self.slot.current
+            if current is None or current.version != model_store.model_version(self.model_path):
+                start = time.perf_counter()
+                self.slot.current = self._read_model()
+                registry.load_times[f"model:{self.model_path}"] = (time.perf_counter() - start) * 1000
+            elif self.use_index and current.index is None:
+                self._replace_index(current)
+
+    def _read_model(self):
+        """从磁盘读取当前发布的模型，构建匹配器（和索引）"""
+        model = model_store.load_model(self.model_path)
+        matcher = LBPHMatcher(
+            model['histograms'],
+            model['labels'],
+            histogram_sums=model['sums'],
+            gallery=model['gallery'],
+            **model['params']
+        )
+        index = GalleryIndex(matcher, self.num_candidates) if self.use_index else None
+        return LoadedModel(matcher, model['names'], model['version'], index)
+
+    def reload_if_changed(self, wait=True):
+        """
+        检测是否发布了新模型，有则加载并替换当前模型
+        加载在调用线程（wait=False 时在后台线程）完成，识别线程继续使用旧模型，不会阻塞或丢帧；
+        新模型加载失败时保留旧模型。返回是否换了模型（wait=False 时总是返回 False）
+        """
+        if not wait:
+            threading.Thread(target=self.reload_if_changed, name="model-reload", daemon=True).start()
+            return False
+
+        version = model_store.model_version(self.model_path)
+        if version is None or version == self.model_version:
+            return False
+
+        # 其他线程正在加载时不重复加载
+        if not self.slot.lock.acquire(blocking=False):
+            return False
+        try:
+            if version == self.model_version:
+                return False
+            model = self._read_model()
+            self.slot.current = model
+            self.slot.reloads += 1
+            if self.result_cache is not None:
+                self.result_cache.clear()
+        except Exception as e:
+            print(f"加载新模型失败，继续使用旧模型: {e}")
+            return False
+        finally:
+            self.slot.lock.release()
+
+        self.metrics.increment("model_reloads")
+        return True
+
+    def start_auto_reload(self, interval=2.0):
+        """后台定时检查是否有新发布的模型"""
+        if self._reload_stop is not None:
+            return
+        stop = threading.Event()
+        self._reload_stop = stop
+
+        def watch():
+            while not stop.wait(interval):
+                self.reload_if_changed()
+
+        threading.Thread(target=watch, name="model-watcher", daemon=True).start()
+
+    def stop_auto_reload(self):
+        if self._reload_stop is not None:
+            self._reload_stop.set()
+        self._reload_stop = None
+
+    def set_index(self, enabled, num_candidates=5):
+        """开启/关闭按身份粗筛的图库索引"""
+        self.use_index = enabled
+        self.num_candidates = num_candidates
+        self.build_index()
+        # 索引是近似搜索，切换后缓存的结果不再对应当前的匹配方式
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    def build_index(self):
+        """根据当前匹配器重建图库索引（持有模型锁，不会与后台换模型交错）"""
+        with self.slot.lock:
+            model = self.slot.current
+            if model is not None:
+                self._replace_index(model)
+
+    def _replace_index(self, model):
+        """调用方已持有 slot.lock"""
+        index = GalleryIndex(model.matcher, self.num_candidates) if self.use_index else None
+        self.slot.current = LoadedModel(model.matcher, model.names, model.version, index)
+
+    def set_result_cache(self, enabled, max_size=CACHE_SIZE, ttl=CACHE_TTL, hash_size=HASH_SIZE):
+        """
+        开启/关闭人脸结果缓存（result_cache.py）：感知哈希相同的人脸直接返回上次的匹配结果
+        ttl 为条目有效秒数（None 表示不过期）；换模型后缓存自动失效
+        """
+        self.result_cache = ResultCache(max_size, ttl, hash_size) if enabled else None
+
+    def set_tracking(self, enabled, detect_interval=10, identity_interval=30):
+        """开启/关闭检测+跟踪模式：每 detect_interval 帧检测一次，身份每 identity_interval 帧刷新一次"""
+        if enabled:
+            self.tracker = FaceTracker(detect_interval, identity_interval)
         else:
-            raise Exception("标签文件不存在")
-
-    def start_recognition(self, threshold=50, names=None):
-        """开始实时识别"""
+            self.tracker = None
+
+    def fork(self):
+        """
+        创建共享同一份模型（匹配器、索引、用户名）的识别器
+        检测器、跟踪与 ROI 状态各自独立，用于多路视频源
+        """
+        other = FaceRecognizer(self.model_path)
+        other.slot = self.slot
+        other.use_index = self.use_index
+        other.num_candidates = self.num_candidates
+        other.threshold = self.threshold
+        other.metrics = self.metrics
+        other.result_cache = self.result_cache
+        other.set_detection(self.detection_scale, self.roi_mode, self.full_sweep_interval)
+        if self.tracker is not None:
+            other.set_tracking(True, self.tracker.detect_interval, self.tracker.identity_interval)
+        return other
+
+    def start_recognition(self, threshold=50, source=0):
+        """
+        开始实时识别，source 为摄像头编号、视频文件或流地址
+        识别期间重新训练发布的模型会在后台加载并自动替换，用户名随模型一起更新
+        """
         if not self.is_model_trained():
             raise Exception("请先训练模型")
 
         self.threshold = threshold
-        self.load_model()
+        if self.slot.current is None:
+            self.load_model()
+        else:
+            self.reload_if_changed()
 
-        if names is not None:
-            self.names.update(names)
+        if self.tracker is not None:
+            self.tracker.reset()
+        self._last_faces = []
 
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            raise Exception("无法打开摄像头")
+        self.cap = open_capture(source)
+        self.start_auto_reload()
 
     def stop_recognition(self):
         """停止识别"""
+        self.stop_auto_reload()
         if self.cap:
             self.cap.release()
         self.cap = None
@@ -73,64 +267,235 @@ class FaceRecognizer:
         if self.cap is None or not self.cap.isOpened():
             return None
 
-        ret, frame = self.cap.read()
+        with self.metrics.timer("read"):
+            ret, frame = self.cap.read()
         if not ret:
             return None
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frame, _ = self.process_frame(frame)
+        return frame
+
+    def process_frame(self, frame, annotate=True):
+        """
+        检测并识别一帧中的人脸，annotate=True 时在帧上绘制结果
+        返回 (frame, results)，results 中每项为 {'box': (x, y, w, h), 'prediction': dict 或 None}
+        """
+        metrics = self.metrics
+        with metrics.timer("convert"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        tracker = self.tracker
+        if tracker is None:
+            with metrics.timer("detect"):
+                boxes = self.detect_faces(gray)
+            predictions = self._predict_boxes(gray, boxes)
+        else:
+            boxes, predictions = self._track_faces(gray, tracker)
+
+        results = []
+        with metrics.timer("draw"):
+            for box, prediction in zip(boxes, predictions):
+                results.append({'box': box, 'prediction': prediction})
+                if annotate:
+                    self._draw_result(frame, box, prediction)
+
+        metrics.increment("frames")
+        metrics.increment("faces", len(results))
+        metrics.increment("unknowns", sum(1 for prediction in predictions
+                                          if prediction is not None and not prediction['is_recognized']))
+        return frame, results
+
+    def recognize_stream(self, source=0, stride=1, interval=None, annotate=False):
+        """
+        对摄像头、视频文件或流逐帧识别（生成器）
+        每个采样帧产出 {'frame': 帧序号, 'time': 秒, 'faces': [...]}，annotate=True 时额外带上绘制后的 'image'；
+        结束后 self.stream_stats 为读取/处理帧数、帧/秒与人脸/秒
+        """
+        if self.matcher is None:
+            self.load_model()
 
+        if self.tracker is not None:
+            self.tracker.reset()
+        self._last_faces = []
+
+        video = VideoSource(source, stride, interval).open()
+        self.stream_stats = None
+        try:
+            for index, timestamp, frame in video.frames():
+                frame, results = self.process_frame(frame, annotate)
+                faces = []
+                for result in results:
+                    prediction = result['prediction']
+                    if prediction is None:
+                        continue
+                    faces.append(dict(prediction_record(prediction), box=[int(v) for v in result['box']]))
+                video.faces += len(faces)
+
+                item = {'frame': index, 'time': round(timestamp, 3), 'faces': faces}
+                if annotate:
+                    item['image'] = frame
+                yield item
+        finally:
+            video.release()
+            self.stream_stats = video.stats()
+
+    def detect_faces(self, gray):
+        """
+        在灰度帧上检测人脸，返回全分辨率坐标的 [(x, y, w, h), ...]
+        ROI 模式下只在上一帧人脸附近搜索，每 full_sweep_interval 帧做一次全帧扫描
+        """
+        if self.roi_mode and self._last_faces and self._frames_since_sweep < self.full_sweep_interval:
+            faces = self._detect_in_rois(gray, self._last_faces)
+            self._frames_since_sweep += 1
+        else:
+            faces = self._detect_scaled(gray)
+            self._frames_since_sweep = 0
+
+        self._last_faces = faces
+        return faces
+
+    def _detect_scaled(self, gray, offset=(0, 0)):
+        """在按 detection_scale 缩小的图像上检测，再把框映射回原始分辨率"""
+        scale = self.detection_scale
+        if scale < 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            scale = 1.0
+            small = gray
+
+        min_side = max(1, int(round(30 * scale)))
         faces = self.detector.detectMultiScale(
-            gray,
+            small,
             scaleFactor=1.1,
             minNeighbors=5,
-            minSize=(30, 30)
+            minSize=(min_side, min_side)
         )
 
-        for (x, y, w, h) in faces:
-            try:
-                face_roi = gray[y:y + h, x:x + w]
-                face_resized = cv2.resize(face_roi, (200, 200), interpolation=cv2.INTER_LINEAR)
-                face_processed = cv2.equalizeHist(face_resized)
-
-                id, confidence = self.recognizer.predict(face_processed)
-                similarity_score = max(0, min(100, 100 - confidence))
-
-                if confidence < self.threshold and id in self.names:
-                    name = self.names[id]
-                    color = (0, 255, 0)
-                    status = f"{name} ({similarity_score:.1f}%)"
-                else:
-                    name = "Unknown"
-                    color = (0, 0, 255)
-                    status = f"{name} ({similarity_score:.1f}%)"
-
-                cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-                cv2.putText(frame, status, (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-
-            except Exception as e:
-                print(f"预测错误: {e}")
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-                cv2.putText(frame, "Error", (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+        ox, oy = offset
+        return [(int(round(x / scale)) + ox, int(round(y / scale)) + oy,
+                 int(round(w / scale)), int(round(h / scale))) for (x, y, w, h) in faces]
+
+    def _detect_in_rois(self, gray, previous):
+        """只在上一帧人脸四周扩展半个框的区域内检测，重叠结果去重"""
+        frame_h, frame_w = gray.shape[:2]
+        faces = []
+        for (x, y, w, h) in previous:
+            x0, y0 = max(0, x - w // 2), max(0, y - h // 2)
+            x1, y1 = min(frame_w, x + w + w // 2), min(frame_h, y + h + h // 2)
+            for face in self._detect_scaled(gray[y0:y1, x0:x1], offset=(x0, y0)):
+                if all(box_iou(face, other) < 0.5 for other in faces):
+                    faces.append(face)
+        return faces
+
+    def set_detection(self, scale=1.0, roi_mode=False, full_sweep_interval=15):
+        """设置检测分辨率（相对原始帧的比例）与 ROI 模式"""
+        self.detection_scale = scale
+        self.roi_mode = roi_mode
+        self.full_sweep_interval = full_sweep_interval
+        self._last_faces = []
+
+    def _predict_boxes(self, gray, boxes):
+        """先裁剪所有人脸，再一次性批量匹配；失败时每个人脸的结果为 None"""
+        if not boxes:
+            return []
+        try:
+            with self.metrics.timer("preprocess"):
+                faces = [crop_face(gray, box) for box in boxes]
+            with self.metrics.timer("predict"):
+                return self.predict_faces(faces)
+        except Exception as e:
+            print(f"预测错误: {e}")
+            return [None] * len(boxes)
+
+    def _track_faces(self, gray, tracker):
+        """跟踪模式：只在关键帧检测，只为新轨迹或身份过期的轨迹做匹配"""
+        # 模型换了（包括共享模型的其他识别器触发的热更新），轨迹缓存的身份全部作废
+        version = self.model_version
+        if version != self._identity_version:
+            tracker.clear_identities()
+            self._identity_version = version
+
+        with self.metrics.timer("detect"):
+            if tracker.needs_detection():
+                pending = tracker.update_with_detections(gray, self.detect_faces(gray))
+            else:
+                pending = tracker.track(gray)
+
+        predictions = self._predict_boxes(gray, [track.box for track in pending])
+        for track, prediction in zip(pending, predictions):
+            if prediction is not None:
+                tracker.set_identity(track, prediction)
+
+        tracks = tracker.tracks
+        return [track.box for track in tracks], [track.prediction for track in tracks]
+
+    def _draw_result(self, frame, box, prediction):
+        x, y, w, h = box
+        if prediction is None:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+            cv2.putText(frame, "Error", (x, y - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+            return
+
+        similarity_score = max(0, min(100, prediction['similarity']))
+        if prediction['is_recognized']:
+            name = prediction['name']
+            color = (0, 255, 0)
+        else:
+            name = "Unknown"
+            color = (0, 0, 255)
+        status = f"{name} ({similarity_score:.1f}%)"
 
-        return frame
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(frame, status, (x, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
 
     def predict_face(self, face_image):
         """预测单个人脸"""
-        if self.recognizer is None:
-            raise Exception("识别器未初始化")
+        return self.predict_faces([face_image])[0]
 
-        id, confidence = self.recognizer.predict(face_image)
-        similarity = max(0, 100 - confidence)
+    def predict_faces(self, face_images):
+        """批量预测多个人脸（一次矩阵匹配）"""
+        # 整批使用同一版模型，期间发生的替换从下一批开始生效
+        model = self.slot.current
+        if model is None:
+            raise Exception("识别器未初始化")
 
-        return {
-            'id': id,
-            'confidence': confidence,
-            'similarity': similarity,
-            'name': self.names.get(id, "Unknown"),
-            'is_recognized': confidence < self.threshold and id in self.names
-        }
+        engine = model.index if self.use_index and model.index is not None else model.matcher
+        names = model.names
+        if self.result_cache is not None:
+            matches = self._match_cached(engine, model.version, face_images)
+        else:
+            matches = engine.match(face_images)
+
+        predictions = []
+        for id, confidence in matches:
+            is_recognized = confidence < self.threshold and id in names
+            predictions.append({
+                'id': id,
+                'confidence': confidence,
+                'similarity': max(0, 100 - confidence),
+                'name': names.get(id, "Unknown"),
+                'is_recognized': is_recognized
+            })
+
+        return predictions
+
+    def _match_cached(self, engine, version, face_images):
+        """先查结果缓存，只把未命中的人脸交给匹配器（仍是一次批量匹配）"""
+        cache = self.result_cache
+        keys = [cache.key(face) for face in face_images]
+        matches = cache.get_many(version, keys)
+        missing = [i for i, match in enumerate(matches) if match is None]
+
+        self.metrics.increment("cache_hits", len(matches) - len(missing))
+        self.metrics.increment("cache_misses", len(missing))
+        if missing:
+            computed = engine.match([face_images[i] for i in missing])
+            for i, match in zip(missing, computed):
+                matches[i] = match
+            cache.put_many(version, [keys[i] for i in missing], computed)
+        return matches
 
     def recognize_image(self, image_path, threshold=None):
         """识别图片中的人脸"""
@@ -141,22 +506,34 @@ class FaceRecognizer:
             raise Exception("模型未训练，请先训练模型")
 
         # 确保模型已加载
-        if not hasattr(self.recognizer, 'getThreshold') or self.recognizer.getThreshold() is None:
+        if self.matcher is None:
             self.load_model()
 
-        # 读取图片 - 处理中文路径
-        try:
-            # 方法1: 使用numpy从文件读取
-            with open(image_path, 'rb') as f:
-                image_array = np.frombuffer(f.read(), np.uint8)
-                image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-        except:
-            # 方法2: 直接读取
-            image = cv2.imread(image_path)
+        image = read_image(image_path)
 
-        if image is None:
-            raise Exception("无法读取图片文件，请检查文件路径和格式")
+        try:
+            image, faces = self.analyze_image(image)
+        except Exception as e:
+            print(f"批量预测人脸时出错: {e}")
+            faces = []
 
+        results = []
+        for i, face in enumerate(faces):
+            prediction = face['prediction']
+            if prediction['is_recognized']:
+                result_text = f"人脸 {i + 1}: {prediction['name']} (相似度: {prediction['similarity']:.1f}%)"
+            else:
+                result_text = f"人脸 {i + 1}: 未知人脸 (置信度: {prediction['confidence']:.1f})"
+            results.append(result_text)
+
+        return image, results
+
+    def analyze_image(self, image, annotate=True, predict=None):
+        """
+        检测并识别一张静态图片中的人脸
+        返回 (image, faces)，faces 中每项为 {'box': (x, y, w, h), 'prediction': dict}；
+        annotate=False 时不在图片上绘制；predict 可替换批量匹配函数（默认 self.predict_faces）
+        """
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
         # 检测人脸
@@ -167,34 +544,67 @@ class FaceRecognizer:
             minSize=(50, 50)
         )
 
-        results = []
-
-        for i, (x, y, w, h) in enumerate(faces):
-            try:
-                face_roi = gray[y:y + h, x:x + w]
-                if face_roi.size == 0:
-                    continue
+        # 裁剪所有人脸后批量匹配
+        boxes = [tuple(int(v) for v in box) for box in faces]
+        predict = predict or self.predict_faces
+        predictions = predict([crop_face(gray, box) for box in boxes])
 
-                face_resized = cv2.resize(face_roi, (200, 200), interpolation=cv2.INTER_LINEAR)
-                face_processed = cv2.equalizeHist(face_resized)
-
-                prediction = self.predict_face(face_processed)
-
-                if prediction['is_recognized']:
-                    result_text = f"人脸 {i + 1}: {prediction['name']} (相似度: {prediction['similarity']:.1f}%)"
-                    color = (0, 255, 0)
-                else:
-                    result_text = f"人脸 {i + 1}: 未知人脸 (置信度: {prediction['confidence']:.1f})"
-                    color = (0, 0, 255)
-
-                results.append(result_text)
-
-                cv2.rectangle(image, (x, y), (x + w, y + h), color, 3)
-                cv2.putText(image, f"{prediction['name']} ({prediction['similarity']:.1f}%)",
-                            (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-
-            except Exception as e:
-                print(f"处理第 {i + 1} 个人脸时出错: {e}")
+        results = []
+        for (x, y, w, h), prediction in zip(boxes, predictions):
+            results.append({'box': (x, y, w, h), 'prediction': prediction})
+            if not annotate:
                 continue
 
-        return image, results
\ No newline at end of file
+            color = (0, 255, 0) if prediction['is_recognized'] else (0, 0, 255)
+            cv2.rectangle(image, (x, y), (x + w, y + h), color, 3)
+            cv2.putText(image, f"{prediction['name']} ({prediction['similarity']:.1f}%)",
+                        (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+        return image, results
+
+
+def crop_face(gray, box):
+    """裁剪、归一化并均衡化人脸区域（识别与服务端共用）"""
+    x, y, w, h = box
+    x, y = max(0, x), max(0, y)
+    face_roi = gray[y:y + h, x:x + w]
+    face_resized = cv2.resize(face_roi, (200, 200), interpolation=cv2.INTER_LINEAR)
+    return cv2.equalizeHist(face_resized)
+
+
+def prediction_record(prediction):
+    """把识别结果转换为可 JSON 序列化的记录；未识别时 name 为 None"""
+    return {
+        'label': int(prediction['id']),
+        'name': prediction['name'] if prediction['is_recognized'] else None,
+        'distance': round(float(prediction['confidence']), 4),
+        'recognized': bool(prediction['is_recognized']),
+    }
+
+
+def decode_image(data, flags=cv2.IMREAD_COLOR):
+    """从内存中的图片字节解码；空数据、非图片数据统一报“无法解码图片数据”"""
+    try:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), flags) if data else None
+    except cv2.error:
+        image = None
+    if image is None:
+        raise Exception("无法解码图片数据")
+    return image
+
+
+def read_image(image_path):
+    """读取彩色图片，支持中文路径"""
+    try:
+        # 方法1: 使用numpy从文件读取
+        with open(image_path, 'rb') as f:
+            image_array = np.frombuffer(f.read(), np.uint8)
+            image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+    except:
+        # 方法2: 直接读取
+        image = cv2.imread(image_path)
+
+    if image is None:
+        raise Exception("无法读取图片文件，请检查文件路径和格式")
+
+    return image
\ No newline at end of file
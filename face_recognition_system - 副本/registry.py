@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+
+# 进程级共享资源：Haar 级联分类器与已加载的模型只加载一次。
+# 本模块不在导入时加载 cv2，界面可以在用到识别功能之前先显示出来。
+FACE_CASCADE = "haarcascade_frontalface_default.xml"
+
+# 各资源的首次加载耗时（毫秒），用于分析启动速度
+load_times = {}
+
+_lock = threading.RLock()
+_local = threading.local()
+_model_slots = {}
+_recognizers = {}
+
+
+def _record(name, start):
+    load_times[name] = (time.perf_counter() - start) * 1000
+
+
+def get_cascade(name=FACE_CASCADE):
+    """
+    返回级联分类器，每个线程只解析一次 XML
+    CascadeClassifier 并发调用 detectMultiScale 不保证线程安全，因此按线程缓存
+    """
+    cascades = getattr(_local, "cascades", None)
+    if cascades is None:
+        cascades = _local.cascades = {}
+
+    cascade = cascades.get(name)
+    if cascade is None:
+        start = time.perf_counter()
+        import cv2
+        cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, name))
+        if cascade.empty():
+            raise Exception(f"无法加载人脸检测器: {name}")
+        cascades[name] = cascade
+        _record(f"cascade:{name}:{threading.current_thread().name}", start)
+    return cascade
+
+
+def get_model_slot(model_path):
+    """同一模型目录在进程内共享一个 ModelSlot，模型只加载一次、热更新时所有识别器一起切换"""
+    from recognize import ModelSlot
+
+    key = os.path.abspath(model_path)
+    with _lock:
+        slot = _model_slots.get(key)
+        if slot is None:
+            slot = _model_slots[key] = ModelSlot()
+        return slot
+
+
+def get_recognizer(model_path=None):
+    """进程内共享的识别器（首次调用时才导入识别模块）"""
+    start = time.perf_counter()
+    import model_store
+    from recognize import FaceRecognizer
+
+    model_path = model_path or model_store.MODEL_DIR
+    key = os.path.abspath(model_path)
+    with _lock:
+        recognizer = _recognizers.get(key)
+        if recognizer is None:
+            recognizer = _recognizers[key] = FaceRecognizer(model_path)
+            _record("recognizer", start)
+        return recognizer
+
+
+def clear():
+    """释放缓存的模型与识别器（当前线程的级联分类器一并清除）"""
+    with _lock:
+        _model_slots.clear()
+        _recognizers.clear()
+    _local.cascades = {}
\ No newline at end of file
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# 人脸结果缓存：键为归一化人脸（200x200 均衡化）的感知哈希加模型版本，值为匹配结果 (label, distance)
+# 感知哈希为差值哈希（dHash）：缩小到 (HASH_SIZE+1) x HASH_SIZE 后比较相邻像素的明暗，
+# 同一张照片重复提交、静止人脸的连续帧得到相同的哈希，直接返回上次的结果，不再匹配。
+# 哈希按完全相同查找：8x8（64 位）能容忍摄像头噪声和 1 像素的框抖动；
+# 位数越多越不容易把不同的人当成同一张脸，但连续帧也越难命中。
+# 哈希只用于查找：不同的人也可能得到相同的哈希（合成数据 1800 张人脸中出现过一对），
+# 每个条目另存一张 VERIFY_SIZE x VERIFY_SIZE 缩略图，命中时平均灰度差超过 MAX_DIFFERENCE
+# 视为哈希冲突、按未命中处理（同一人脸加噪声和 1 像素抖动约 4，冲突的两个人约 17）
+CACHE_SIZE = 1024
+CACHE_TTL = 60.0
+HASH_SIZE = 8
+VERIFY_SIZE = 16
+MAX_DIFFERENCE = 8.0
+
+
+def perceptual_hash(face_image, hash_size=HASH_SIZE):
+    """归一化人脸的差值哈希，返回 hash_size*hash_size 位打包成的 bytes"""
+    small = cv2.resize(face_image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1]).tobytes()
+
+
+def thumbnail(face_image, size=VERIFY_SIZE):
+    """命中时用于确认是同一张脸的缩略图"""
+    return cv2.resize(face_image, (size, size), interpolation=cv2.INTER_AREA)
+
+
+class ResultCache:
+    """
+    有容量上限的 LRU 结果缓存，线程安全
+    超过 max_size 时淘汰最久未用的条目；ttl 秒（None 表示不过期）之后的条目视为未命中；
+    哈希相同但缩略图差异超过 max_difference 的（哈希冲突）也视为未命中，计入 collisions。
+    缓存的是匹配距离而不是是否识别，调整阈值不影响缓存
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL, hash_size=HASH_SIZE,
+                 max_difference=MAX_DIFFERENCE):
+        if max_size <= 0:
+            raise Exception("缓存容量必须大于0")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hash_size = hash_size
+        self.max_difference = max_difference
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collisions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, face_image):
+        """查找键：(感知哈希, 缩略图)，哈希用于查找，缩略图用于确认"""
+        return perceptual_hash(face_image, self.hash_size), thumbnail(face_image)
+
+    def _same_face(self, thumb, other):
+        return np.abs(thumb.astype(np.int16) - other).mean() <= self.max_difference
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _check_version(self, version):
+        """模型版本变化时清空缓存（调用方已持有锁）"""
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get_many(self, version, keys):
+        """按键查找，返回与 keys 等长的列表，未命中为 None"""
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            self._check_version(version)
+            for digest, thumb in keys:
+                entry = self._entries.get(digest)
+                if entry is not None and self.ttl is not None and now - entry[1] > self.ttl:
+                    del self._entries[digest]
+                    entry = None
+                if entry is not None and not self._same_face(thumb, entry[2]):
+                    self.collisions += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    results.append(entry[0])
+        return results
+
+    def put_many(self, version, keys, results):
+        """写入匹配结果（哈希冲突时新结果替换旧条目）；模型已经换了版本时丢弃旧版本算出的结果"""
+        now = time.monotonic()
+        with self._lock:
+            if version != self.version:
+                return
+            for (digest, thumb), result in zip(keys, results):
+                self._entries[digest] = (result, now, thumb)
+                self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'collisions': self.collisions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
\ No newline at end of file
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+# 打包样本库目录结构（每个用户两个文件，代替成百上千张小图片）：
+#   {user}.bin    N 张 200x200 uint8 人脸首尾相接，只追加写入，训练时内存映射为 (N, 200, 200) 数组
+#   {user}.json   索引：格式版本、尺寸、已提交的样本数、每个样本的来源名
+# 索引中的 count 才是有效样本数；追加中途断电留下的多余字节在下次追加时截掉
+SAMPLES_DIR = "data/samples"
+SAMPLE_SIZE = 200
+FORMAT_NAME = "face-samples"
+FORMAT_VERSION = 1
+
+PACK_SUFFIX = ".bin"
+INDEX_SUFFIX = ".json"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def _pack_path(user_name, store_dir):
+    return os.path.join(store_dir, user_name + PACK_SUFFIX)
+
+
+def _index_path(user_name, store_dir):
+    return os.path.join(store_dir, user_name + INDEX_SUFFIX)
+
+
+def _empty_index():
+    return {'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'size': SAMPLE_SIZE, 'count': 0, 'names': []}
+
+
+def _read_index(user_name, store_dir):
+    index_path = _index_path(user_name, store_dir)
+    if not os.path.exists(index_path):
+        return _empty_index()
+
+    with open(index_path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get('format') != FORMAT_NAME:
+        raise Exception(f"不是有效的样本库索引: {index_path}")
+    if index.get('version', 0) > FORMAT_VERSION:
+        raise Exception(f"样本库格式版本过新: {index.get('version')}")
+    if index.get('size') != SAMPLE_SIZE:
+        raise Exception(f"样本尺寸不一致: {index.get('size')}")
+    return index
+
+
+def _write_index(user_name, store_dir, index):
+    """先写临时文件再替换，读取方不会看到写了一半的索引"""
+    index_path = _index_path(user_name, store_dir)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(index_path + ".tmp", index_path)
+
+
+def _as_samples(faces):
+    """整理为 (n, 200, 200) uint8 连续数组，尺寸不对的逐张缩放"""
+    if isinstance(faces, np.ndarray) and faces.shape[1:] == (SAMPLE_SIZE, SAMPLE_SIZE):
+        return np.ascontiguousarray(faces, dtype=np.uint8)
+
+    import cv2
+
+    samples = np.empty((len(faces), SAMPLE_SIZE, SAMPLE_SIZE), dtype=np.uint8)
+    for i, face in enumerate(faces):
+        face = np.asarray(face)
+        if face.ndim != 2:
+            raise Exception("样本必须是灰度图像")
+        if face.shape != (SAMPLE_SIZE, SAMPLE_SIZE):
+            face = cv2.resize(face, (SAMPLE_SIZE, SAMPLE_SIZE))
+        samples[i] = face
+    return samples
+
+
+def list_users(store_dir=SAMPLES_DIR):
+    """样本库中的用户名"""
+    if not os.path.exists(store_dir):
+        return []
+    return sorted(name[:-len(INDEX_SUFFIX)] for name in os.listdir(store_dir)
+                  if name.endswith(INDEX_SUFFIX))
+
+
+def user_exists(user_name, store_dir=SAMPLES_DIR):
+    return os.path.exists(_index_path(user_name, store_dir))
+
+
+def sample_count(user_name, store_dir=SAMPLES_DIR):
+    return _read_index(user_name, store_dir)['count']
+
+
+def sample_names(user_name, store_dir=SAMPLES_DIR):
+    return list(_read_index(user_name, store_dir)['names'])
+
+
+def fingerprint(user_name, store_dir=SAMPLES_DIR):
+    """用户样本的指纹（样本数与索引修改时间），用于判断是否需要重新提取特征"""
+    stat = os.stat(_index_path(user_name, store_dir))
+    return ("pack", sample_count(user_name, store_dir), stat.st_mtime_ns)
+
+
+def append_samples(user_name, faces, names=None, store_dir=SAMPLES_DIR):
+    """
+    追加人脸样本
+    faces: 200x200 灰度人脸列表或 (n, 200, 200) 数组
+    names: 每个样本的来源名（导出时作为文件名），为空时按序号命名
+    先写数据再更新索引，返回该用户的样本总数
+    """
+    samples = _as_samples(faces)
+    os.makedirs(store_dir, exist_ok=True)
+    index = _read_index(user_name, store_dir)
+    count = index['count']
+
+    if names is None:
+        names = [f"{count + i}.png" for i in range(len(samples))]
+    elif len(names) != len(samples):
+        raise Exception("样本数量与名称数量不一致")
+
+    sample_bytes = SAMPLE_SIZE * SAMPLE_SIZE
+    with open(_pack_path(user_name, store_dir), "ab") as f:
+        # 截掉上次未提交的数据
+        f.truncate(count * sample_bytes)
+        f.seek(count * sample_bytes)
+        f.write(samples.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+    index['count'] = count + len(samples)
+    index['names'] = index['names'] + list(names)
+    _write_index(user_name, store_dir, index)
+    return index['count']
+
+
+def load_samples(user_name, store_dir=SAMPLES_DIR, mmap=True):
+    """
+    读取一个用户的全部样本，返回 (n, 200, 200) uint8 数组
+    mmap=True 时以只读内存映射打开，只打开一个文件，不逐张解码
+    """
+    count = _read_index(user_name, store_dir)['count']
+    if count == 0:
+        return np.empty((0, SAMPLE_SIZE, SAMPLE_SIZE), dtype=np.uint8)
+
+    pack_path = _pack_path(user_name, store_dir)
+    shape = (count, SAMPLE_SIZE, SAMPLE_SIZE)
+    if os.path.getsize(pack_path) < count * SAMPLE_SIZE * SAMPLE_SIZE:
+        raise Exception(f"样本库文件不完整: {pack_path}")
+
+    if mmap:
+        return np.memmap(pack_path, dtype=np.uint8, mode="r", shape=shape)
+    return np.fromfile(pack_path, dtype=np.uint8, count=count * SAMPLE_SIZE * SAMPLE_SIZE).reshape(shape)
+
+
+def remove_user(user_name, store_dir=SAMPLES_DIR):
+    for path in (_index_path(user_name, store_dir), _pack_path(user_name, store_dir)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def import_directory(data_dir="data/processed", store_dir=SAMPLES_DIR, users=None):
+    """
+    把现有的 data/processed/{user}/*.jpg 目录导入样本库（覆盖库中同名用户）
+    返回 {用户名: 样本数}
+    """
+    import cv2
+
+    if not os.path.exists(data_dir):
+        raise Exception("预处理数据目录不存在")
+
+    if users is None:
+        users = sorted(name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name)))
+
+    counts = {}
+    for user_name in users:
+        user_dir = os.path.join(data_dir, user_name)
+        faces = []
+        names = []
+        for img_name in sorted(os.listdir(user_dir)):
+            if img_name.startswith(".") or not img_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            img = cv2.imread(os.path.join(user_dir, img_name), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                faces.append(img)
+                names.append(img_name)
+
+        remove_user(user_name, store_dir)
+        counts[user_name] = append_samples(user_name, faces, names, store_dir) if faces else 0
+    return counts
+
+
+def export_directory(store_dir=SAMPLES_DIR, data_dir="data/processed", users=None):
+    """把样本库导出为 {data_dir}/{user}/ 下的单张图片，返回 {用户名: 样本数}"""
+    import cv2
+
+    if users is None:
+        users = list_users(store_dir)
+
+    counts = {}
+    for user_name in users:
+        user_dir = os.path.join(data_dir, user_name)
+        os.makedirs(user_dir, exist_ok=True)
+        samples = load_samples(user_name, store_dir)
+        for face, img_name in zip(samples, sample_names(user_name, store_dir)):
+            cv2.imwrite(os.path.join(user_dir, img_name), face)
+        counts[user_name] = len(samples)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="打包样本库与图片目录之间的导入导出")
+    parser.add_argument("action", choices=["import", "export", "list"], help="import: 目录 -> 样本库；export: 样本库 -> 目录")
+    parser.add_argument("--data", default="data/processed", help="图片目录")
+    parser.add_argument("--store", default=SAMPLES_DIR, help="样本库目录")
+    parser.add_argument("--users", nargs="*", help="只处理这些用户")
+    args = parser.parse_args()
+
+    if args.action == "import":
+        counts = import_directory(args.data, args.store, args.users)
+    elif args.action == "export":
+        counts = export_directory(args.store, args.data, args.users)
+    else:
+        counts = {user: sample_count(user, args.store) for user in (args.users or list_users(args.store))}
+
+    for user_name, count in counts.items():
+        print(f"{user_name}: {count}")
+    print(f"共 {len(counts)} 个用户, {sum(counts.values())} 个样本")
\ No newline at end of file
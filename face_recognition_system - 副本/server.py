@@ -0,0 +1,251 @@
+import argparse
+import base64
+import binascii
+import json
+import queue
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import cv2
+
+import model_store
+from batcher import PredictionBatcher
+from recognize import FaceRecognizer, crop_face, decode_image, prediction_record
+from result_cache import CACHE_TTL
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class ServiceBusy(Exception):
+    """所有识别线程都在忙，且排队超时"""
+
+
+class RecognitionService:
+    """
+    无界面识别服务
+    模型在启动时只加载一次；workers 个识别器共享同一份模型，各自持有检测器，
+    同一时间最多 workers 个请求在做识别，其余请求最多排队 queue_timeout 秒；
+    batch_size > 1 时各请求的人脸经 PredictionBatcher 合并匹配；
+    cache_size > 0 时重复提交的人脸直接返回缓存的结果（各识别器共用一个缓存）
+    """
+
+    def __init__(self, model_path=model_store.MODEL_DIR, threshold=50, workers=2, queue_timeout=10.0,
+                 batch_size=1, batch_wait_ms=5.0, cache_size=0, cache_ttl=CACHE_TTL):
+        self.recognizer = FaceRecognizer(model_path)
+        self.recognizer.set_threshold(threshold)
+        if cache_size > 0:
+            self.recognizer.set_result_cache(True, cache_size, cache_ttl)
+        self.recognizer.load_model()
+        self.batcher = PredictionBatcher(self.recognizer, batch_size, batch_wait_ms) if batch_size > 1 else None
+
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._pool = queue.Queue()
+        for _ in range(workers):
+            self._pool.put(self.recognizer.fork())
+
+        self.requests = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._pool.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            with self._lock:
+                self.rejected += 1
+            raise ServiceBusy()
+
+    def _batched_predict(self, faces):
+        """经批处理器匹配，最多等待 queue_timeout 秒，超时按服务繁忙处理"""
+        try:
+            return self.batcher.predict_faces(faces, self.queue_timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.rejected += 1
+            raise ServiceBusy()
+
+    def recognize_image(self, data):
+        """识别整张图片，返回每个人脸的框与身份"""
+        image = decode_image(data)
+        recognizer = self._acquire()
+        try:
+            predict = self._batched_predict if self.batcher is not None else None
+            _, faces = recognizer.analyze_image(image, annotate=False, predict=predict)
+        finally:
+            self._pool.put(recognizer)
+        with self._lock:
+            self.requests += 1
+        return [dict(prediction_record(face['prediction']), box=[int(v) for v in face['box']]) for face in faces]
+
+    def recognize_faces(self, faces_data):
+        """识别已裁剪好的人脸（任意尺寸，统一缩放到200x200并均衡化）"""
+        faces = []
+        for data in faces_data:
+            face = decode_image(data, cv2.IMREAD_GRAYSCALE)
+            h, w = face.shape[:2]
+            faces.append(crop_face(face, (0, 0, w, h)))
+
+        # 合并匹配时同样先占用一个识别名额，同时处理的请求数不超过 workers
+        recognizer = self._acquire()
+        try:
+            if self.batcher is not None:
+                predictions = self._batched_predict(faces)
+            else:
+                predictions = recognizer.predict_faces(faces)
+        finally:
+            self._pool.put(recognizer)
+        with self._lock:
+            self.requests += 1
+        return [prediction_record(prediction) for prediction in predictions]
+
+    def health(self):
+        health = {
+            'status': "ok",
+            'samples': len(self.recognizer.matcher),
+            'users': len(self.recognizer.names),
+            'workers': self.workers,
+            'idle_workers': self._pool.qsize(),
+            'requests': self.requests,
+            'rejected': self.rejected,
+        }
+        if self.batcher is not None:
+            health['batching'] = self.batcher.stats()
+        if self.recognizer.result_cache is not None:
+            health['cache'] = self.recognizer.result_cache.stats()
+        return health
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+
+
+def _decode_base64(item):
+    """JSON 中的 base64 图片；格式不对时与原始请求体一样报“无法解码图片数据”"""
+    try:
+        return base64.b64decode(item, validate=True)
+    except (binascii.Error, ValueError, TypeError):
+        raise Exception("无法解码图片数据")
+
+
+def _decode_base64_list(items):
+    return [_decode_base64(item) for item in items]
+
+
+class RecognitionHandler(BaseHTTPRequestHandler):
+    """
+    POST /recognize        请求体为图片字节，或 JSON {"image": base64}
+    POST /recognize/faces  JSON {"faces": [base64, ...]}，每项为一张已裁剪的人脸
+    GET  /health           模型与服务状态
+    GET  /metrics          Prometheus 文本格式指标
+    """
+
+    service = None
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            raise ValueError("请求体为空")
+        if length > MAX_BODY_BYTES:
+            raise OverflowError("请求体过大")
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, self.service.health())
+        elif path == "/metrics":
+            body = self.service.recognizer.metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {'error': "not found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path not in ("/recognize", "/recognize/faces"):
+            self._send_json(404, {'error': "not found"})
+            return
+
+        start = time.perf_counter()
+        try:
+            body = self._read_body()
+            is_json = (self.headers.get("Content-Type") or "").startswith("application/json")
+            payload = json.loads(body) if is_json else None
+
+            if path == "/recognize":
+                data = _decode_base64(payload['image']) if is_json else body
+                result = {'faces': self.service.recognize_image(data)}
+            else:
+                if not is_json:
+                    raise ValueError("/recognize/faces 需要 JSON 请求体")
+                result = {'faces': self.service.recognize_faces(_decode_base64_list(payload['faces']))}
+        except OverflowError as e:
+            self._send_json(413, {'error': str(e)})
+            return
+        except ServiceBusy:
+            self._send_json(503, {'error': "服务繁忙，请稍后重试"})
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(422, {'error': str(e)})
+            return
+
+        result['ms'] = round((time.perf_counter() - start) * 1000, 2)
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(service, host="127.0.0.1", port=8000):
+    """创建（未启动的）HTTP 服务，每个连接一个线程，识别并发由 service.workers 限制"""
+    handler = type("BoundRecognitionHandler", (RecognitionHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="无界面人脸识别 HTTP 服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--model", default=model_store.MODEL_DIR, help="模型目录")
+    parser.add_argument("--threshold", type=float, default=50, help="识别阈值")
+    parser.add_argument("--workers", type=int, default=2, help="同时进行识别的请求数")
+    parser.add_argument("--queue-timeout", type=float, default=10.0, help="请求排队等待识别的最长时间（秒）")
+    parser.add_argument("--batch-size", type=int, default=1, help="合并匹配的最大人脸数（1 表示不合并）")
+    parser.add_argument("--batch-wait-ms", type=float, default=5.0, help="凑批的最长等待时间（毫秒）")
+    parser.add_argument("--cache-size", type=int, default=0, help="人脸结果缓存的条目数（0 表示不缓存）")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL, help="缓存结果的有效时间（秒）")
+    args = parser.parse_args()
+
+    service = RecognitionService(args.model, args.threshold, args.workers, args.queue_timeout,
+                                 args.batch_size, args.batch_wait_ms, args.cache_size, args.cache_ttl)
+    server = create_server(service, args.host, args.port)
+    print(f"识别服务已启动: http://{args.host}:{args.port} "
+          f"({len(service.recognizer.names)} 个用户, {args.workers} 个识别线程)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
\ No newline at end of file
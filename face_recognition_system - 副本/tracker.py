@@ -0,0 +1,166 @@
+import cv2
+
+# 模板匹配在缩小后的图像上进行，人脸模板宽度缩放到该像素数
+TEMPLATE_WIDTH = 32
+
+
+def box_iou(a, b):
+    """两个 (x, y, w, h) 框的交并比"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """一个被跟踪的人脸及其缓存的身份"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.template = None
+        self.score = 1.0
+        self.prediction = None
+        self.frames_since_identity = 0
+
+
+class FaceTracker:
+    """
+    检测 + 跟踪
+    每 detect_interval 帧（或跟踪置信度低于 min_score 时）运行一次 Haar 检测，
+    中间帧用缩小尺度的模板匹配跟踪人脸；身份按轨迹缓存，每 identity_interval 帧刷新一次
+    """
+
+    def __init__(self, detect_interval=10, identity_interval=30, min_score=0.6, iou_threshold=0.3):
+        self.detect_interval = detect_interval
+        self.identity_interval = identity_interval
+        self.min_score = min_score
+        self.iou_threshold = iou_threshold
+        self.tracks = []
+        self.frame_count = 0
+        self.detections = 0
+        self._next_id = 0
+        self._force_detection = True
+
+    def reset(self):
+        self.tracks = []
+        self.frame_count = 0
+        self._force_detection = True
+
+    def needs_detection(self):
+        """本帧是否需要运行检测"""
+        return self._force_detection or self.frame_count % self.detect_interval == 0
+
+    def _set_template(self, gray, track):
+        x, y, w, h = track.box
+        patch = gray[y:y + h, x:x + w]
+        if patch.size == 0:
+            track.template = None
+            return
+        scale = TEMPLATE_WIDTH / float(w)
+        track.template = cv2.resize(patch, (TEMPLATE_WIDTH, max(1, int(round(h * scale)))),
+                                    interpolation=cv2.INTER_AREA)
+
+    def update_with_detections(self, gray, boxes):
+        """用检测结果更新轨迹（按 IoU 贪心关联），返回需要识别身份的轨迹"""
+        self.frame_count += 1
+        self.detections += 1
+        self._force_detection = False
+
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        pairs = sorted(
+            ((box_iou(track.box, box), i, j) for i, track in enumerate(self.tracks) for j, box in enumerate(boxes)),
+            reverse=True)
+
+        matched_tracks = set()
+        matched_boxes = set()
+        tracks = []
+        for iou, i, j in pairs:
+            if iou < self.iou_threshold:
+                break
+            if i in matched_tracks or j in matched_boxes:
+                continue
+            matched_tracks.add(i)
+            matched_boxes.add(j)
+            track = self.tracks[i]
+            track.box = boxes[j]
+            track.score = 1.0
+            tracks.append(track)
+
+        # 未关联上的检测框作为新轨迹，未关联上的旧轨迹丢弃
+        for j, box in enumerate(boxes):
+            if j not in matched_boxes:
+                tracks.append(FaceTrack(self._next_id, box))
+                self._next_id += 1
+
+        self.tracks = tracks
+        for track in self.tracks:
+            self._set_template(gray, track)
+            track.frames_since_identity += 1
+
+        return self.pending_identity()
+
+    def track(self, gray):
+        """不运行检测时，用模板匹配在上一位置附近跟踪每个人脸，返回需要识别身份的轨迹"""
+        self.frame_count += 1
+        frame_h, frame_w = gray.shape[:2]
+
+        for track in self.tracks:
+            track.frames_since_identity += 1
+            if track.template is None:
+                track.score = 0.0
+                continue
+
+            x, y, w, h = track.box
+            scale = TEMPLATE_WIDTH / float(w)
+
+            # 搜索窗口为人脸框向四周各扩展半个框
+            sx0 = max(0, x - w // 2)
+            sy0 = max(0, y - h // 2)
+            sx1 = min(frame_w, x + w + w // 2)
+            sy1 = min(frame_h, y + h + h // 2)
+            window = gray[sy0:sy1, sx0:sx1]
+            small = cv2.resize(window, (max(1, int(round((sx1 - sx0) * scale))),
+                                        max(1, int(round((sy1 - sy0) * scale)))),
+                               interpolation=cv2.INTER_AREA)
+
+            th, tw = track.template.shape
+            if small.shape[0] < th or small.shape[1] < tw:
+                track.score = 0.0
+                continue
+
+            result = cv2.matchTemplate(small, track.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (mx, my) = cv2.minMaxLoc(result)
+            track.score = score
+            track.box = (sx0 + int(round(mx / scale)), sy0 + int(round(my / scale)), w, h)
+
+        # 跟踪置信度下降时下一帧重新检测
+        if any(track.score < self.min_score for track in self.tracks):
+            self._force_detection = True
+
+        return self.pending_identity()
+
+    def pending_identity(self):
+        """没有身份或身份缓存过期的轨迹"""
+        return [track for track in self.tracks
+                if track.prediction is None or track.frames_since_identity >= self.identity_interval]
+
+    def clear_identities(self):
+        """丢弃所有轨迹缓存的身份（换模型后），轨迹保留，下一帧重新匹配"""
+        for track in self.tracks:
+            track.prediction = None
+            track.frames_since_identity = 0
+
+    def set_identity(self, track, prediction):
+        track.prediction = prediction
+        track.frames_since_identity = 0
+
+    def stats(self):
+        return {
+            'frames': self.frame_count,
+            'detections': self.detections,
+            'tracks': len(self.tracks),
+        }
\ No newline at end of file
@@ -3,47 +3,305 @@ import cv2
 import numpy as np
 import pickle
 
+import gallery_codec
+import model_store
+import prototypes as prototype_selection
+import sample_store
+from matcher import (CALIBRATION_SAMPLES, DEFAULT_PROFILE, extract_histograms, feature_params,
+                     histogram_size, profile_distance_scale)
 
-def train(data_dir="data/processed", model_path="lbph_model.yml", labels_path="labels.pkl"):
+# 默认配置与 cv2.face.LBPHFaceRecognizer_create() 默认值一致
+LBPH_PARAMS = feature_params(DEFAULT_PROFILE)
+EXTRACT_BATCH_SIZE = 32
+# 校准距离换算系数时每个用户取的样本数（同一用户的样本互为最近邻）
+CALIBRATION_PER_USER = 4
+STATE_FORMAT = "train-state"
+
+
+def _user_fingerprint(user_dir):
+    """用户样本目录的指纹（文件名、大小、修改时间），用于判断是否需要重新提取"""
+    entries = []
+    for img_name in sorted(os.listdir(user_dir)):
+        img_path = os.path.join(user_dir, img_name)
+        if os.path.isfile(img_path) and not img_name.startswith("."):
+            stat = os.stat(img_path)
+            entries.append((img_name, stat.st_size, stat.st_mtime_ns))
+    return tuple(entries)
+
+
+def _extract_user_features(user_dir, params):
+    """读取一个用户的全部样本并提取LBPH直方图"""
+    faces = []
+    for img_name in sorted(os.listdir(user_dir)):
+        # 跳过预处理清单等隐藏文件
+        if img_name.startswith("."):
+            continue
+
+        img_path = os.path.join(user_dir, img_name)
+        img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+
+        if img is not None:
+            faces.append(img)
+
+    return _extract_batches(faces, params)
+
+
+def _extract_batches(faces, params):
+    """分批提取直方图；faces 可以是图片列表或样本库内存映射的 (n, 200, 200) 数组"""
+    histograms = [
+        extract_histograms(faces[i:i + EXTRACT_BATCH_SIZE], **params)
+        for i in range(0, len(faces), EXTRACT_BATCH_SIZE)
+    ]
+    if not histograms:
+        return None
+    return np.vstack(histograms)
+
+
+def extract_features(source, params):
+    """提取一个用户的直方图：source 为样本目录或样本库数组（iter_users 的返回值），没有样本时返回 None"""
+    if isinstance(source, np.ndarray):
+        return _extract_batches(source, params)
+    return _extract_user_features(source, params)
+
+
+def _spread(total, count):
+    """在 0..total-1 中均匀取至多 count 个下标"""
+    if total == 0:
+        return []
+    return np.unique(np.linspace(0, total - 1, count).astype(int))
+
+
+def _calibration_faces(source, count=CALIBRATION_PER_USER):
+    """从一个用户的样本中均匀取 count 张人脸，用于校准距离换算系数"""
+    if isinstance(source, np.ndarray):
+        return [source[i] for i in _spread(len(source), count)]
+
+    names = [name for name in sorted(os.listdir(source)) if not name.startswith(".")]
+    faces = []
+    for i in _spread(len(names), count):
+        img = cv2.imread(os.path.join(source, names[i]), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            faces.append(img)
+    return faces
+
+
+def iter_users(data_dir="data/processed", store_dir=None):
     """
-    训练人脸识别模型
+    遍历训练用户，返回 (用户名, 指纹, 样本来源)
+    store_dir 不为空时从打包样本库读取（来源为内存映射数组），否则读取 data_dir 下的图片目录
     """
-    faces = []
-    labels = []
-    label_dict = {}
-    current_label = 0
+    if store_dir is not None:
+        for user_name in sample_store.list_users(store_dir):
+            yield (user_name, sample_store.fingerprint(user_name, store_dir),
+                   sample_store.load_samples(user_name, store_dir))
+        return
 
-    if not os.path.exists(data_dir):
+    for user_name in os.listdir(data_dir):
+        user_dir = os.path.join(data_dir, user_name)
+        if os.path.isdir(user_dir):
+            yield user_name, _user_fingerprint(user_dir), user_dir
+
+
+def _load_state(model_path, state_path):
+    """读取上一次训练的结果；没有模型时返回 None，旧的 YAML 模型也可作为增量基础"""
+    gallery = {'encoding': "float32"}
+    if model_store.model_exists(model_path):
+        model = model_store.load_model(model_path)
+        histograms, labels = model['histograms'], model['labels']
+        params, label_dict, gallery = model['params'], model['names'], model['gallery']
+    elif model_store.legacy_model_exists():
+        histograms, labels, params, label_dict = model_store.read_legacy_model()
+    else:
+        return None
+
+    # 旧版本训练的模型没有指纹文件，所有用户都会被重新提取，但标签ID保持不变
+    fingerprints, _ = _read_state(state_path)
+    return histograms, labels, params, label_dict, fingerprints, gallery
+
+
+def _previous_state(model_path, state_path, incremental):
+    """
+    上一次训练的结果，用于沿用标签ID（完整训练也需要）
+    完整训练可用来修复损坏的模型，此时读取失败视为没有模型；增量训练读取失败直接报错
+    """
+    if incremental:
+        return _load_state(model_path, state_path)
+    try:
+        return _load_state(model_path, state_path)
+    except Exception:
+        return None
+
+
+def _read_state(state_path):
+    """
+    读取训练状态：各用户的样本指纹与下一个可分配的标签ID
+    标签ID只增不减，删除的用户的ID不会分给新用户；旧版本的状态文件只有指纹
+    """
+    if not os.path.exists(state_path):
+        return {}, 0
+    with open(state_path, "rb") as f:
+        state = pickle.load(f)
+    if state.get('format') == STATE_FORMAT:
+        return state['fingerprints'], state['next_label']
+    return state, 0
+
+
+def _next_label(state_path, label_dict):
+    return max([_read_state(state_path)[1]] + [label + 1 for label in label_dict])
+
+
+def _save(model_path, state_path, histograms, labels, params, label_dict, fingerprints, gallery=None,
+          next_label=0):
+    model_store.save_model(histograms, labels, params, label_dict, model_path, gallery)
+    state = {'format': STATE_FORMAT, 'fingerprints': fingerprints,
+             'next_label': max([next_label] + [label + 1 for label in label_dict])}
+    with open(state_path, "wb") as f:
+        pickle.dump(state, f)
+
+
+def train(data_dir="data/processed", model_path=model_store.MODEL_DIR, incremental=False,
+          state_path="train_state.pkl", store_dir=None, profile=DEFAULT_PROFILE, encoding="float32",
+          pca_components=gallery_codec.PCA_COMPONENTS, prototypes=None, prototype_method="kmedoids",
+          stats=None):
+    """
+    训练人脸识别模型
+    incremental=True 时只为新增或样本有变化的用户提取特征并追加到已有模型，
+    已删除的用户会从模型中移除；无论是否增量，已有用户（按用户名）始终沿用原标签ID，
+    只有新用户分配新ID，模型外保存的标签ID（批量识别结果、服务端客户端）在重新训练后仍然有效；
+    store_dir 指定打包样本库（sample_store）时从样本库读取，不再逐个打开图片文件；
+    profile 为特征配置名（matcher.FEATURE_PROFILES），随模型保存，识别时使用同一配置。
+    已有模型的配置与 profile 不同时，增量训练会重新提取所有用户；
+    encoding 为图库存储编码（gallery_codec.ENCODINGS），压缩编码无法还原全精度直方图，
+    因此基于压缩模型的增量训练同样会重新提取所有用户；
+    非 lbph 配置在训练时校准距离换算系数（matcher.profile_distance_scale），使识别阈值对各配置通用，
+    增量训练沿用已有模型中同一配置的系数，完整训练重新校准；
+    prototypes=k 时每个用户只保留 k 个代表样本（prototypes.select_prototypes），
+    stats 传入 dict 时填入用户数、提取的样本数与保留的原型数
+    """
+    if store_dir is not None:
+        if not sample_store.list_users(store_dir):
+            raise Exception("样本库为空")
+    elif not os.path.exists(data_dir):
         raise Exception("预处理数据目录不存在")
 
+    params = feature_params(profile)
+    state = _previous_state(model_path, state_path, incremental)
+    if (incremental and state is not None and dict({'mapping': "none"}, **state[2]) == params
+            and state[5]['encoding'] == "float32"):
+        histograms, labels, _, label_dict, old_fingerprints, _ = state
+    else:
+        histograms = np.empty((0, histogram_size(params)), dtype=np.float32)
+        labels = np.empty(0, dtype=np.int32)
+        # 完整训练或配置、编码变化时所有样本重新提取，已有用户仍沿用原标签ID
+        label_dict = dict(state[3]) if state is not None else {}
+        old_fingerprints = {}
+
+    # 距离换算系数：lbph 为 1，其他配置沿用已有模型的系数，没有时从各用户的样本中校准
+    profile_scale = 1.0 if profile == DEFAULT_PROFILE else None
+    if (profile_scale is None and incremental and state is not None and 'profile_scale' in state[5]
+            and dict({'mapping': "none"}, **state[2]) == params):
+        profile_scale = state[5]['profile_scale']
+    calibration = []
+
+    # 已有用户沿用原标签ID，新用户从未用过的ID开始分配（重新训练也不复用已删除用户的ID）
+    name_to_label = {name: label for label, name in label_dict.items()}
+    next_label = _next_label(state_path, label_dict)
+
+    fingerprints = {}
+    extracted = 0
+    kept = 0
+    new_histograms = [histograms]
+    new_labels = [labels]
+    stale_labels = []
+
     # 收集训练数据
-    for user_name in os.listdir(data_dir):
-        user_dir = os.path.join(data_dir, user_name)
-        if not os.path.isdir(user_dir):
+    for user_name, fingerprint, source in iter_users(data_dir, store_dir):
+        # 原型设置变化时该用户需要重新选择
+        if prototypes is not None:
+            fingerprint = (fingerprint, prototypes, prototype_method)
+        if profile_scale is None and len(calibration) < 2 * CALIBRATION_SAMPLES:
+            calibration.extend(_calibration_faces(source))
+        if old_fingerprints.get(user_name) == fingerprint:
+            fingerprints[user_name] = fingerprint
+            continue
+
+        if user_name in name_to_label:
+            stale_labels.append(name_to_label[user_name])
+            label = name_to_label[user_name]
+        else:
+            label = next_label
+            next_label += 1
+
+        user_histograms = extract_features(source, params)
+        if user_histograms is None:
+            label_dict.pop(label, None)
             continue
 
-        label_dict[current_label] = user_name
+        extracted += len(user_histograms)
+        if prototypes is not None:
+            user_histograms = user_histograms[
+                prototype_selection.select_prototypes(user_histograms, prototypes, prototype_method)]
+        kept += len(user_histograms)
 
-        for img_name in os.listdir(user_dir):
-            img_path = os.path.join(user_dir, img_name)
-            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+        label_dict[label] = user_name
+        fingerprints[user_name] = fingerprint
+        new_histograms.append(user_histograms)
+        new_labels.append(np.full(len(user_histograms), label, dtype=np.int32))
 
-            if img is not None:
-                faces.append(img)
-                labels.append(current_label)
+    # 目录已被删除的用户
+    for user_name, label in name_to_label.items():
+        if user_name not in fingerprints:
+            stale_labels.append(label)
+            label_dict.pop(label, None)
 
-        current_label += 1
+    # 去掉变化或删除用户的旧样本（只影响这些用户的行）
+    keep = ~np.isin(labels, stale_labels)
+    new_histograms[0] = histograms[keep]
+    new_labels[0] = labels[keep]
 
-    if len(faces) == 0:
+    histograms = np.vstack(new_histograms)
+    labels = np.concatenate(new_labels)
+
+    if len(histograms) == 0:
         raise Exception("没有找到训练数据")
 
-    # 训练模型
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.train(faces, np.array(labels))
+    if stats is not None:
+        stats.update(users=len(label_dict), samples=extracted, prototypes=kept, gallery=len(labels),
+                     method=prototype_method if prototypes is not None else None)
 
     # 保存模型和标签
-    recognizer.write(model_path)
-    with open(labels_path, "wb") as f:
-        pickle.dump(label_dict, f)
+    histograms, gallery = gallery_codec.encode(histograms, encoding, pca_components)
+    if profile != DEFAULT_PROFILE:
+        gallery['profile_scale'] = (profile_scale if profile_scale is not None
+                                    else profile_distance_scale(calibration, params))
+    _save(model_path, state_path, histograms, labels, params, label_dict, fingerprints, gallery, next_label)
+
+    return label_dict
+
+
+def remove_user(user_name, model_path=model_store.MODEL_DIR, state_path="train_state.pkl"):
+    """从已训练的模型中移除一个用户的样本，其他用户不受影响"""
+    state = _load_state(model_path, state_path)
+    if state is None:
+        raise Exception("模型未训练，请先训练模型")
+
+    histograms, labels, params, label_dict, fingerprints, gallery = state
+    removed = [label for label, name in label_dict.items() if name == user_name]
+    if not removed:
+        raise Exception(f"用户 {user_name} 不在模型中")
+
+    keep = ~np.isin(labels, removed)
+    next_label = _next_label(state_path, label_dict)
+    for label in removed:
+        del label_dict[label]
+    fingerprints.pop(user_name, None)
+
+    # 压缩编码直接删除对应行，主成分等保持不变
+    gallery = dict(gallery)
+    for key in model_store.GALLERY_ROW_ARRAYS:
+        if key in gallery:
+            gallery[key] = gallery[key][keep]
+    _save(model_path, state_path, histograms[keep], labels[keep], params, label_dict, fingerprints, gallery,
+          next_label)
 
     return label_dict
\ No newline at end of file
@@ -1,8 +1,6 @@
 from datetime import datetime
 import os
 
-import numpy as np
-
 
 def get_current_time():
     """获取当前时间字符串"""
@@ -19,6 +17,8 @@ def analyze_lbp_features(face_image):
     """
     分析LBP特征（用于调试）
     """
+    import numpy as np
+
     # 将图像分成8x8的小区域
     height, width = face_image.shape
     cell_height = height // 8
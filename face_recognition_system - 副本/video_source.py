@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+
+def parse_source(source):
+    """摄像头编号（整数或数字字符串）转为 int，视频文件路径或流地址保持原样"""
+    if isinstance(source, str) and source.strip().isdigit():
+        return int(source.strip())
+    return source
+
+
+def is_file_source(source):
+    """是否为本地视频文件（读完即结束），摄像头与网络流返回 False"""
+    source = parse_source(source)
+    return isinstance(source, str) and "://" not in source
+
+
+def open_capture(source=0):
+    """打开摄像头、视频文件或流（rtsp/http 等）"""
+    source = parse_source(source)
+    if isinstance(source, str) and "://" not in source and not os.path.exists(source):
+        raise Exception(f"视频文件不存在: {source}")
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        if isinstance(source, int):
+            raise Exception("无法打开摄像头")
+        raise Exception(f"无法打开视频源: {source}")
+    return cap
+
+
+class VideoSource:
+    """
+    视频源帧采样
+    stride=N 时每 N 帧处理一帧，interval=秒 时按时间间隔采样（优先于 stride）；
+    跳过的帧只 grab 不解码，长视频可以快于实时处理
+    """
+
+    def __init__(self, source=0, stride=1, interval=None):
+        if stride < 1:
+            raise Exception("采样步长必须大于等于1")
+        if interval is not None and interval <= 0:
+            raise Exception("采样间隔必须大于0")
+
+        self.source = parse_source(source)
+        self.stride = stride
+        self.interval = interval
+        self.cap = None
+        self.is_file = False
+        self.video_fps = 0.0
+        self.frames_read = 0
+        self.frames_sampled = 0
+        self.faces = 0
+        self.media_seconds = 0.0
+        self.seconds = 0.0
+
+    def open(self):
+        self.cap = open_capture(self.source)
+        self.is_file = is_file_source(self.source)
+        self.video_fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        return self
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+        self.cap = None
+
+    def _frame_step(self):
+        """视频文件按帧率把时间间隔换算为帧步长；实时源按墙钟时间采样，返回 None"""
+        if self.interval is None:
+            return self.stride
+        if self.is_file and self.video_fps > 0:
+            return max(1, int(round(self.interval * self.video_fps)))
+        return None
+
+    def _timestamp(self, started):
+        if self.is_file:
+            return self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        return time.perf_counter() - started
+
+    def frames(self):
+        """逐个产出 (帧序号, 时间戳秒, 帧)，视频结束或读取失败时停止"""
+        if self.cap is None:
+            self.open()
+
+        started = time.perf_counter()
+        step = self._frame_step()
+        next_sample = 0.0
+        index = -1
+        try:
+            while True:
+                index += 1
+                if step is not None:
+                    sample = index % step == 0
+                else:
+                    sample = time.perf_counter() - started >= next_sample
+
+                if not sample:
+                    # 只抓取不解码
+                    if not self.cap.grab():
+                        break
+                    self.frames_read += 1
+                    continue
+
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self.frames_read += 1
+                self.frames_sampled += 1
+
+                timestamp = self._timestamp(started)
+                self.media_seconds = timestamp
+                if step is None:
+                    next_sample += self.interval
+                self.seconds = time.perf_counter() - started
+                yield index, timestamp, frame
+        finally:
+            self.seconds = time.perf_counter() - started
+            self.release()
+
+    def stats(self):
+        seconds = self.seconds
+        return {
+            'frames_read': self.frames_read,
+            'frames_processed': self.frames_sampled,
+            'faces': self.faces,
+            'seconds': seconds,
+            'fps': self.frames_sampled / seconds if seconds > 0 else 0.0,
+            'faces_per_sec': self.faces / seconds if seconds > 0 else 0.0,
+            # 视频时长 / 处理耗时，大于1表示快于实时
+            'realtime_factor': self.media_seconds / seconds if self.is_file and seconds > 0 else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    from recognize import FaceRecognizer
+
+    parser = argparse.ArgumentParser(description="对摄像头、视频文件或视频流逐帧识别，每帧输出一行 JSON")
+    parser.add_argument("source", help="摄像头编号、视频文件或流地址")
+    parser.add_argument("--stride", type=int, default=1, help="每 N 帧处理一帧")
+    parser.add_argument("--interval", type=float, default=None, help="按时间间隔（秒）采样，优先于 --stride")
+    parser.add_argument("--threshold", type=float, default=50, help="识别阈值")
+    parser.add_argument("-o", "--output", help="输出 JSONL 文件（默认标准输出）")
+    args = parser.parse_args()
+
+    recognizer = FaceRecognizer()
+    recognizer.set_threshold(args.threshold)
+    stream = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for result in recognizer.recognize_stream(args.source, args.stride, args.interval):
+            stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    stats = recognizer.stream_stats
+    print(f"完成: 读取 {stats['frames_read']} 帧, 处理 {stats['frames_processed']} 帧, "
+          f"{stats['faces']} 个人脸, {stats['seconds']:.1f} 秒, "
+          f"{stats['fps']:.1f} 帧/秒, {stats['faces_per_sec']:.1f} 人脸/秒", file=sys.stderr)
\ No newline at end of file